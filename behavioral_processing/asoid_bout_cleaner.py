@@ -1,8 +1,9 @@
 
 import math
+import heapq
+from bisect import bisect_right
 import numpy as np
-from sklearn.cluster import DBSCAN
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 from tqdm import tqdm
 from typing import List, Tuple, Iterable
 
@@ -32,6 +33,106 @@ def split_by_neutral(seq: np.ndarray, neutral_ids: List[int]) -> List[Tuple[int,
         segments.append((start, len(seq)))
     return segments
 
+def gap_clusters_1d(values: np.ndarray, positions: np.ndarray, eps: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-value 1D clustering of positions: within each value, sorted positions are split
+    wherever the gap exceeds eps (identical to DBSCAN(eps, min_samples=1) on 1D data).
+    values[i] is the value observed at positions[i]; positions need not be sorted or start at 0.
+    Clusters come out ordered by value, then left to right.
+    Returns: order (positions grouped by cluster), cluster_starts (offsets into order), cluster_vals
+    """
+    idx = np.lexsort((positions, values))
+    order = positions[idx]
+    sorted_vals = values[idx]
+    breaks = (sorted_vals[1:] != sorted_vals[:-1]) | (np.diff(order) > eps)
+    cluster_starts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+    return order, cluster_starts, sorted_vals[cluster_starts]
+
+def fill_rare_values(wseq: np.ndarray, rare_vals: np.ndarray) -> np.ndarray:
+    """
+    Replace rare values in place with the preceding frame's value (next frame's at index 0),
+    processed value by value in ascending order.
+    Positions after the first common value reduce to a forward-fill from the nearest common
+    value on their left; only the all-rare prefix (at most a few frames) is replayed step by step.
+    """
+    n = len(wseq)
+    is_rare = np.isin(wseq, rare_vals)
+    if not is_rare.any():
+        return wseq
+    common = np.flatnonzero(~is_rare)
+    first_common = common[0] if len(common) else n
+
+    head = wseq[:first_common + 1].copy()
+    for val in rare_vals:
+        for idx in np.flatnonzero(head[:first_common] == val):
+            if idx > 0:
+                head[idx] = head[idx-1]
+            elif idx < n-1:
+                head[idx] = head[idx+1]
+
+    src = np.where(is_rare, 0, np.arange(n))
+    np.maximum.accumulate(src, out=src)
+    wseq[:] = wseq[src]
+    wseq[:first_common] = head[:first_common]
+    return wseq
+
+class FreeIntervals:
+    """
+    Sorted, disjoint free intervals [start, end] of a segment of length n.
+    Point and window queries are bisect lookups; taking a free window splits its interval in two.
+    """
+
+    def __init__(self, n: int):
+        self.starts = [0]
+        self.ends = [n - 1]
+
+    def _find(self, x: int) -> int:
+        i = bisect_right(self.starts, x) - 1
+        return i if i >= 0 and self.ends[i] >= x else -1
+
+    def is_free(self, x: int) -> bool:
+        return self._find(x) >= 0
+
+    def run_end(self, x: int) -> int:
+        """Last index of the free run containing x (x must be free)."""
+        return self.ends[self._find(x)]
+
+    def fits(self, a: int, b: int) -> bool:
+        i = self._find(a)
+        return i >= 0 and self.ends[i] >= b
+
+    def take(self, a: int, b: int):
+        """Mark [a, b] as assigned (the window must fit)."""
+        i = self._find(a)
+        s0, e0 = self.starts[i], self.ends[i]
+        if a > s0 and b < e0:
+            self.ends[i] = a - 1
+            self.starts.insert(i + 1, b + 1)
+            self.ends.insert(i + 1, e0)
+        elif a > s0:
+            self.ends[i] = a - 1
+        elif b < e0:
+            self.starts[i] = b + 1
+        else:
+            del self.starts[i]
+            del self.ends[i]
+
+def merge_short_runs(assigned: np.ndarray, min_cluster_size: int) -> np.ndarray:
+    """
+    Absorb runs shorter than min_cluster_size into the preceding run (a short first run
+    takes the value two frames past its end). Chained short runs all inherit the last long run.
+    """
+    starts, ends, values = (np.asarray(a) for a in zip(*array_to_iterable_runs(assigned)))
+    lengths = ends - starts + 1
+    keep = lengths >= min_cluster_size
+    if not keep[0]:
+        values[0] = assigned[ends[0] + 2]
+        keep[0] = True
+    src = np.where(keep, np.arange(len(values)), 0)
+    np.maximum.accumulate(src, out=src)
+    assigned[:] = np.repeat(values[src], lengths)
+    return assigned
+
 def process_segment(
     seq:np.ndarray,
     eps_frames: int = 5,
@@ -46,50 +147,36 @@ def process_segment(
     
     counts = np.bincount(wseq)
     rare_vals = np.where(counts < 3)[0]
-    
-    for val in rare_vals:
-        mask = wseq == val
-        indices = np.where(mask)[0]
-        for idx in indices:
-            if idx > 0:
-                wseq[idx] = wseq[idx-1]
-            elif idx < n-1:
-                wseq[idx] = wseq[idx+1]
+    fill_rare_values(wseq, rare_vals)
                 
     clusters = []
-    unique_vals = np.unique(wseq)
-
-    for val in unique_vals:
-        indices = np.where(wseq == val)[0].reshape(-1, 1)
-        clustering = DBSCAN(eps=eps_frames, min_samples=1).fit(indices)
-        labels = clustering.labels_
-        
-        for lbl in set(labels):
-            cluster_idx = indices[labels == lbl].flatten()
-            size = len(cluster_idx)
-            com = np.mean(cluster_idx)
-
-            start = int(custom_round(com)) - size // 2
-            end = int(custom_round(com)) + size // 2 - (1 if size % 2 == 0 else 0)
-            if end >= n:
-                delta = end + 1 - n
-                start -= delta
-                end -= delta
-            if start < 0:
-                end += start
-                start = 0
-
-            clusters.append({
-                'val': val,
-                'com': com,
-                'size': size,
-                'start': start,
-                'end': end
-            })
-        
+    order, cluster_starts, cluster_vals = gap_clusters_1d(wseq, np.arange(n), eps_frames)
+    cluster_sizes = np.diff(np.append(cluster_starts, n))
+    cluster_coms = np.add.reduceat(order, cluster_starts) / cluster_sizes
+
+    for val, size, com in zip(cluster_vals, cluster_sizes.tolist(), cluster_coms.tolist()):
+        start = int(custom_round(com)) - size // 2
+        end = int(custom_round(com)) + size // 2 - (1 if size % 2 == 0 else 0)
+        if end >= n:
+            delta = end + 1 - n
+            start -= delta
+            end -= delta
+        if start < 0:
+            end += start
+            start = 0
+
+        clusters.append({
+            'val': val,
+            'com': com,
+            'size': size,
+            'start': start,
+            'end': end
+        })
+
     clusters.sort(key=lambda x: x['size'])
     
     assigned = -np.ones(n, dtype=np.int8)
+    free = FreeIntervals(n)
     reserved = []
     
     for c in clusters:
@@ -97,43 +184,81 @@ def process_segment(
             reserved.append(c)
             continue
         s, e = c['start'], c['end']
-        if np.all(assigned[s:e+1] == -1):
-            assigned[s:e+1] = c['val']
-        elif assigned[s] != -1 and assigned[e] != -1:
-            reserved.append(c)
-        elif assigned[s] == -1:
-            delta = e - np.where(assigned[s:e+1] != -1)[0][0] + 1
-            if np.all(assigned[s-delta:e+1-delta] == -1) and s-delta > 0:
-                assigned[s-delta:e+1-delta] = c['val']
-            else:
-                reserved.append(c)
-        elif assigned[e] == -1:
-            delta = np.where(assigned[s:e+1] != -1)[0][0] + 1
-            if np.all(assigned[s+delta:e+1+delta] == -1) and e+delta < n:
-                assigned[s+delta:e+1+delta] = c['val']
-            else:
-                reserved.append(c)
+        if free.fits(s, e):
+            placed = (s, e)
+        elif not free.is_free(s) and not free.is_free(e):
+            placed = None
+        elif free.is_free(s):
+            # Shift left by the offset of the first taken frame inside the window
+            delta = e - (free.run_end(s) + 1 - s) + 1
+            placed = (s-delta, e-delta) if s-delta > 0 and free.fits(s-delta, e-delta) else None
         else:
+            placed = (s+1, e+1) if e+1 < n and free.fits(s+1, e+1) else None
+
+        if placed is None:
             reserved.append(c)
+        else:
+            free.take(*placed)
+            assigned[placed[0]:placed[1]+1] = c['val']
 
-    reserved.sort(key=lambda x: x['com']) 
-    reserved_vals = []
+    reserved.sort(key=lambda x: x['com'])
+    reserved_vals = np.repeat([rc['val'] for rc in reserved], [rc['size'] for rc in reserved])
+    assigned[assigned==-1] = reserved_vals
 
-    for rc in reserved:
-        reserved_vals.extend([rc['val']]*rc['size'])
+    return merge_short_runs(assigned, min_cluster_size)
 
-    assigned[assigned==-1] = reserved_vals
+def _process_segment_batch(batch, eps_frames, min_cluster_size):
+    return [(seq_idx, start, end, process_segment(segment, eps_frames, min_cluster_size))
+            for seq_idx, start, end, segment in batch]
 
-    for start, end, val in array_to_iterable_runs(assigned):
-        if start > 0 and val == assigned[start-1]:
-            continue
-        if end - start + 1 < min_cluster_size:
-            if start > 0:
-                assigned[start:end+1] = assigned[start-1]
-            else:
-                assigned[start:end+1] = assigned[end+2]
+def _balanced_batches(items, sizes, n_batches):
+    """Greedy largest-first assignment of items to n_batches with near-equal total size."""
+    heap = [(0, b) for b in range(n_batches)]
+    batches = [[] for _ in range(n_batches)]
+    for i in np.argsort(sizes)[::-1]:
+        load, b = heapq.heappop(heap)
+        batches[b].append(items[i])
+        heapq.heappush(heap, (load + int(sizes[i]), b))
+    return [batch for batch in batches if batch]
 
-    return assigned
+def refine_bouts_cohort(
+    seqs: List[np.ndarray],
+    neutral_ids: List[int],
+    eps_frames: int = 5,
+    min_cluster_size: int = 3,
+    n_jobs: int = -1,
+    batches_per_worker: int = 4
+) -> List[np.ndarray]:
+    """
+    Refine bouts of many sequences (sessions x tracks) with a single worker pool.
+
+    Segments of all sequences are collected up front and dispatched in size-balanced
+    batches, so pool startup and per-task overhead are paid once per cohort instead of
+    once per sequence. Results are stitched back in the input order.
+    """
+    items, sizes = [], []
+    for seq_idx, seq in enumerate(seqs):
+        for start, end in split_by_neutral(seq, neutral_ids):
+            items.append((seq_idx, start, end, seq[start:end]))
+            sizes.append(end - start)
+
+    refined_seqs = [seq.copy() for seq in seqs]
+    if not items:
+        return refined_seqs
+
+    batches = _balanced_batches(items, np.asarray(sizes), min(len(items), effective_n_jobs(n_jobs) * batches_per_worker))
+
+    with Parallel(n_jobs=n_jobs, verbose=0) as pool:
+        results = pool(
+            delayed(_process_segment_batch)(batch, eps_frames, min_cluster_size)
+            for batch in tqdm(batches, total=len(batches), desc="Stitching Bouts")
+        )
+
+    for batch_result in results:
+        for seq_idx, start, end, refined_segment in batch_result:
+            refined_seqs[seq_idx][start:end] = refined_segment
+
+    return refined_seqs
 
 def refine_bouts_parallel(
     seq: np.ndarray,
@@ -143,26 +268,7 @@ def refine_bouts_parallel(
     n_jobs: int = -1
 ) -> np.ndarray:
 
-    segments = split_by_neutral(seq, neutral_ids)
-    
-    if not segments:
-        return seq.copy()
-    
-    def process_one(seg_bounds):
-        start, end = seg_bounds
-        segment = seq[start:end]
-        refined = process_segment(segment, eps_frames, min_cluster_size)
-        return start, end, refined
-    
-    results = Parallel(n_jobs=n_jobs, verbose=0)(
-        delayed(process_one)(seg) for seg in tqdm(segments, total=len(segments), desc="Stitching Bouts")
-    )
-
-    refined_seq = seq.copy()
-    for start, end, refined_segment in results:
-        refined_seq[start:end] = refined_segment
-    
-    return refined_seq
+    return refine_bouts_cohort([seq], neutral_ids, eps_frames, min_cluster_size, n_jobs)[0]
 
 if __name__ == "__main__":
     seq_input = "3333777667667624444422222676277678776676672222111111111122211223333"
@@ -1,12 +1,18 @@
 import os
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+import matplotlib.colors as mcolors
+from PIL import Image, ImageDraw, ImageFont
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.ndimage import median_filter
 from hmmlearn import hmm
+from joblib import Parallel, delayed, effective_n_jobs
 from tqdm import tqdm
 from typing import List, Tuple, Dict, Literal
+from pose_store import PoseView, load_pose_frame, pose_frame_count
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -97,8 +103,30 @@ def calculate_valid_body_mask(df, individuals=['1', '2'], min_angle_deg=90.0):
             
     return valid_mask
 
-def extract_features(pose_file, mask, window_size=5, feature_subset='default'):
-    df = pd.read_csv(pose_file, header=[0, 1, 2])
+def rolling_window_stats(x, window_sizes, chunk_size=16384):
+    """
+    Trailing-window mean and std (ddof=0) of every column of x, edge-padded at the start,
+    for one or several window sizes in one pass over the data.
+    Windows are strided views reduced chunk by chunk, so results are identical to slicing
+    each frame's window and memory stays bounded. Returns [(mean, std), ...] per window size.
+    """
+    n_frames = len(x)
+    max_w = max(window_sizes)
+    padded = np.pad(x, ((max_w-1, 0), (0, 0)), mode='edge')
+    stats = [(np.empty_like(x), np.empty_like(x)) for _ in window_sizes]
+
+    for c0 in range(0, n_frames, chunk_size):
+        c1 = min(n_frames, c0 + chunk_size)
+        for (w_mean, w_std), w in zip(stats, window_sizes):
+            off = max_w - w
+            # (frames, window, features): same layout as a padded[i:i+w] slice per frame
+            windows = sliding_window_view(padded[c0+off:c1+off+w-1], w, axis=0).transpose(0, 2, 1)
+            w_mean[c0:c1] = windows.mean(axis=1)
+            w_std[c0:c1] = windows.std(axis=1)
+    return stats
+
+def extract_features(pose_file, mask, window_size=5, feature_subset='default', pose_cache_dir=None, min_angle_deg=90.0):
+    df = load_pose_frame(pose_file, pose_cache_dir)
     n_frames = len(df)
 
     if len(mask) != n_frames:
@@ -109,7 +137,7 @@ def extract_features(pose_file, mask, window_size=5, feature_subset='default'):
         else:
             raise ValueError(f"Mask length mismatch: mask={len(mask)}, frames={n_frames}")
 
-    bio_valid_mask = calculate_valid_body_mask(df, individuals=['1', '2'], min_angle_deg=90.0)
+    bio_valid_mask = calculate_valid_body_mask(df, individuals=['1', '2'], min_angle_deg=min_angle_deg)
     final_mask = mask & bio_valid_mask
 
     def get_centroid_series(df_full, individual_name):
@@ -226,23 +254,18 @@ def extract_features(pose_file, mask, window_size=5, feature_subset='default'):
     base_array = np.column_stack([all_base_features[name].values for name in selected_names])
 
     # === TEMPORAL WINDOWING ===
-    n_frames, n_feats = base_array.shape
-    padded = np.pad(base_array, ((window_size-1, 0), (0, 0)), mode='edge')
-
-    window_feats_list = []
-    for i in range(n_frames):
-        window = padded[i:i+window_size]
-        w_mean = window.mean(axis=0)
-        w_std = window.std(axis=0)
-        combined = np.concatenate([base_array[i], w_mean, w_std])
-        window_feats_list.append(combined)
-
-    final_features = np.array(window_feats_list)
-
-    # Generate feature names
-    temporal_feature_names = []
-    for name in selected_names:
-        temporal_feature_names.extend([f"{name}_raw", f"{name}_win_mean", f"{name}_win_std"])
+    # window_size may be a list to get mean/std blocks for several window lengths at once
+    window_sizes = [window_size] if np.isscalar(window_size) else list(window_size)
+    window_stats = rolling_window_stats(base_array, window_sizes)
+    final_features = np.hstack([base_array] + [block for pair in window_stats for block in pair])
+
+    # Generate feature names in the same block order as the hstack above:
+    # all raw columns, then per window all means followed by all stds
+    suffixes = ["win"] if len(window_sizes) == 1 else [f"win{w}" for w in window_sizes]
+    temporal_feature_names = [f"{name}_raw" for name in selected_names]
+    for suffix in suffixes:
+        for stat in ("mean", "std"):
+            temporal_feature_names.extend(f"{name}_{suffix}_{stat}" for name in selected_names)
 
     # Apply final mask
     masked_features = final_features[final_mask]
@@ -250,43 +273,110 @@ def extract_features(pose_file, mask, window_size=5, feature_subset='default'):
 
     return masked_features, df_masked_visual, temporal_feature_names, final_mask
 
-def predict_with_bout_resets(model, features_norm, all_mask_indices, file_feature_lengths, min_gap_frames=10):
-    labels = np.zeros(len(features_norm), dtype=int)
-    feat_start = 0
-    
-    for file_idx, n_file_feats in enumerate(file_feature_lengths):
-        feat_end = feat_start + n_file_feats
-        
-        pose_indices = all_mask_indices[file_idx]
-        
-        if len(pose_indices) == 0:
-            feat_start = feat_end
-            continue
-    
-        bouts = indices_to_spans(pose_indices)
-
-        merged_bouts = []
-        for bout in bouts:
-            if not merged_bouts or bout[0] - merged_bouts[-1][1] > min_gap_frames:
-                merged_bouts.append(list(bout))
-            else:
-                merged_bouts[-1][1] = bout[1]
-
-        for bout_start_pose, bout_end_pose in merged_bouts:
-            in_bout = (pose_indices >= bout_start_pose) & (pose_indices <= bout_end_pose)
-            bout_feat_offsets = np.where(in_bout)[0]
-            
-            if len(bout_feat_offsets) == 0:
-                continue
-
-            global_start = feat_start + bout_feat_offsets[0]
-            global_end = feat_start + bout_feat_offsets[-1] + 1
-
-            labels[global_start:global_end] = model.predict(features_norm[global_start:global_end])
-        
-        feat_start = feat_end
-        
-    return labels
+def feature_cache_path(cache_dir, asoid_file, pose_file, behavior, window_size, feature_subset, min_angle_deg):
+    """Cache file keyed by both input files (path, mtime, size) and every extraction parameter."""
+    key = {'behavior': behavior, 'window_size': window_size, 'feature_subset': feature_subset, 'min_angle_deg': min_angle_deg,
+           'name_order': 'block'}
+    for role, path in (('asoid', asoid_file), ('pose', pose_file)):
+        st = os.stat(path)
+        key[role] = [os.path.abspath(path), st.st_mtime_ns, st.st_size]
+    h = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode())
+    stem = os.path.splitext(os.path.basename(pose_file))[0]
+    return os.path.join(cache_dir, f"{stem}_{h.hexdigest()[:12]}.npz")
+
+def extract_pair_features(asoid_file, pose_file, behavior, window_size=5, feature_subset='default', pose_cache_dir=None,
+                          min_angle_deg=90.0, feature_cache_dir=None):
+    """
+    Behavior mask + features for one ASOID/pose pair.
+    With feature_cache_dir, the masked features, valid indices and names are stored per parameter
+    set and reused on later runs. Pose rows are not returned; use a PoseView over valid_indices.
+    Errors are returned instead of raised, so one broken file cannot abort a worker pool.
+    Returns (feats, feature_names, valid_indices, error)
+    """
+    try:
+        cache_path = None
+        if feature_cache_dir is not None:
+            cache_path = feature_cache_path(feature_cache_dir, asoid_file, pose_file, behavior,
+                                            window_size, feature_subset, min_angle_deg)
+            if os.path.isfile(cache_path):
+                with np.load(cache_path) as cached:
+                    return cached['features'], cached['feature_names'].tolist(), cached['valid_indices'], None
+
+        mask = extract_behavior_mask(asoid_file, behavior)
+        feats, _, fnames, final_mask = extract_features(pose_file, mask, window_size, feature_subset,
+                                                                 pose_cache_dir, min_angle_deg)
+        valid_indices = np.where(final_mask)[0]
+
+        if cache_path is not None:
+            os.makedirs(feature_cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                np.savez(fh, features=feats, valid_indices=valid_indices, feature_names=np.array(fnames))
+            os.replace(tmp_path, cache_path)
+        return feats, fnames, valid_indices, None
+    except Exception as e:
+        return None, None, None, f"{type(e).__name__}: {e}"
+
+def extract_features_parallel(pairs, behavior, window_size=5, feature_subset='default', pose_cache_dir=None,
+                              min_angle_deg=90.0, feature_cache_dir=None, n_jobs=-1):
+    """
+    Run extract_pair_features for every pair in a process pool; results keep the order of pairs.
+    The progress bar advances as results come back, not as tasks are dispatched.
+    """
+    with Parallel(n_jobs=n_jobs, return_as='generator') as pool:
+        results = pool(
+            delayed(extract_pair_features)(asoid_file, pose_file, behavior, window_size, feature_subset,
+                                           pose_cache_dir, min_angle_deg, feature_cache_dir)
+            for asoid_file, pose_file in pairs
+        )
+        return list(tqdm(results, total=len(pairs), desc="Extracting Features", unit="file", ncols=100))
+
+def bout_lengths(all_mask_indices, file_feature_lengths, min_gap_frames=10):
+    """
+    Lengths of the merged bouts covering the concatenated feature rows of all files.
+    A bout starts at every file start and wherever consecutive valid pose frames are
+    more than min_gap_frames apart (gaps up to min_gap_frames are bridged).
+    """
+    sizes = np.array([len(ix) for ix in all_mask_indices], dtype=int)
+    if not np.array_equal(sizes, np.asarray(file_feature_lengths, dtype=int)):
+        raise ValueError("Mask indices and feature lengths disagree per file")
+    if sizes.sum() == 0:
+        return np.array([], dtype=int)
+
+    pose_indices = np.concatenate(all_mask_indices)
+    new_bout = np.ones(len(pose_indices), dtype=bool)
+    new_bout[1:] = np.diff(pose_indices) > max(min_gap_frames, 1)
+    file_starts = np.cumsum(sizes) - sizes
+    new_bout[file_starts[sizes > 0]] = True
+
+    starts = np.flatnonzero(new_bout)
+    return np.diff(np.append(starts, len(pose_indices)))
+
+def _decode_concat(model, X, lengths):
+    return model.predict(X, lengths=lengths), model.predict_proba(X, lengths=lengths)
+
+def predict_with_bout_resets(model, features_norm, all_mask_indices, file_feature_lengths, min_gap_frames=10,
+                             n_jobs=1, n_chunks=None):
+    """
+    Viterbi labels and posteriors with the HMM restarted at every bout (see bout_lengths),
+    each computed in one call via hmmlearn's `lengths`. With n_jobs != 1 the bouts are split
+    into n_chunks contiguous groups decoded in parallel.
+    Returns (labels, probs)
+    """
+    lengths = bout_lengths(all_mask_indices, file_feature_lengths, min_gap_frames)
+    if len(lengths) == 0:
+        return np.zeros(0, dtype=int), np.zeros((0, model.n_components))
+    if n_jobs == 1:
+        return _decode_concat(model, features_norm, lengths)
+
+    n_chunks = min(len(lengths), n_chunks or 4 * effective_n_jobs(n_jobs))
+    bounds = np.linspace(0, len(lengths), n_chunks + 1, dtype=int)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(_decode_concat)(model, features_norm[offsets[a]:offsets[b]], lengths[a:b])
+        for a, b in zip(bounds[:-1], bounds[1:]) if a < b
+    )
+    return np.concatenate([c[0] for c in chunks]), np.vstack([c[1] for c in chunks])
 
 def visualize_clustering_2d(
     features, 
@@ -402,8 +492,117 @@ def visualize_cluster_distributions(
     plt.savefig(save_path, dpi=150, bbox_inches='tight')
     print(f"Distribution plot saved to {save_path}")
 
+def bout_feature_bounds(all_mask_indices, file_feature_lengths):
+    """Global feature-row bounds (starts, ends; inclusive) of every run of consecutive pose frames."""
+    lengths = bout_lengths(all_mask_indices, file_feature_lengths, min_gap_frames=0)
+    ends = np.cumsum(lengths) - 1
+    return ends - lengths + 1, ends
+
+def select_prototype_candidates(global_idx, prob, file_idx, bout_start, bout_end,
+                                n_prototypes, min_distance_frames, window_frames):
+    """
+    Greedy prototype pick over one cluster's frames: highest probability first (ties in frame
+    order), skipping frames whose +-window_frames window leaves their bout and frames closer than
+    min_distance_frames to the previous pick from the same file.
+    Only the top slice of valid frames (argpartition) is sorted; it grows if the greedy pass
+    runs out. Returns positions into the input arrays.
+    """
+    valid = (global_idx - window_frames >= bout_start) & (global_idx + window_frames <= bout_end)
+    cand = np.flatnonzero(valid)
+    n_top = min(len(cand), max(4 * n_prototypes, 64))
+
+    while True:
+        if n_top < len(cand):
+            part = np.argpartition(-prob[cand], n_top - 1)[:n_top]
+            # Keep every tie of the cut-off value so the slice is an exact prefix of the full ordering
+            top = cand[prob[cand] >= prob[cand[part]].min()]
+        else:
+            top = cand
+        order = top[np.lexsort((global_idx[top], -prob[top]))]
+
+        selected = []
+        last_selected_per_file = {}
+        for i in order:
+            if len(selected) >= n_prototypes:
+                break
+            f, g = file_idx[i], global_idx[i]
+            if f in last_selected_per_file and abs(g - last_selected_per_file[f]) < min_distance_frames:
+                continue
+            selected.append(i)
+            last_selected_per_file[f] = g
+
+        if len(selected) >= n_prototypes or len(top) == len(cand):
+            return selected
+        n_top *= 4
+
+PROTO_COLORS = [tuple(int(round(255 * c)) for c in mcolors.to_rgb(f"C{i}")) for i in range(10)]
+
+def _render_prototype_tile(proto, frame_i, tile_size, font):
+    """One frame of one prototype: spine chains with labels, drawn into a square RGB tile."""
+    img = Image.new('RGB', (tile_size, tile_size), 'white')
+    draw = ImageDraw.Draw(img)
+    header = 24
+    min_x, max_x, min_y, max_y = proto['bounds']
+    scale = min(tile_size / (max_x - min_x), (tile_size - header) / (max_y - min_y))
+    off_x = (tile_size - (max_x - min_x) * scale) / 2
+    off_y = header + (tile_size - header - (max_y - min_y) * scale) / 2
+
+    # Shorter prototypes in a grid hold their last frame
+    frame_i = min(frame_i, proto['n_frames'] - 1)
+    for k, (ind, xs, ys) in enumerate(proto['tracks']):
+        color = PROTO_COLORS[k % len(PROTO_COLORS)]
+        px = off_x + (xs[frame_i] - min_x) * scale
+        py = off_y + (ys[frame_i] - min_y) * scale  # image rows grow downward, like the inverted y axis
+        ok = ~(np.isnan(px) | np.isnan(py))
+        for a in range(len(px) - 1):
+            if ok[a] and ok[a+1]:
+                draw.line([(px[a], py[a]), (px[a+1], py[a+1])], fill=color, width=2)
+        for x, y in zip(px[ok], py[ok]):
+            draw.ellipse([x - 3, y - 3, x + 3, y + 3], fill=color)
+        if ok.any():
+            cx, cy = px[ok].mean(), py[ok].mean()
+            box = draw.textbbox((cx, cy), ind, font=font)
+            draw.rectangle([box[0] - 2, box[1] - 2, box[2] + 2, box[3] + 2], fill='white', outline=color)
+            draw.text((cx, cy), ind, fill='black', font=font)
+
+    draw.text((6, 6), proto['title'], fill='black', font=font)
+    draw.rectangle([0, 0, tile_size - 1, tile_size - 1], outline=(220, 220, 220))
+    return img
+
+def _write_animation(frames, out_path, fps):
+    if out_path.endswith('.mp4'):
+        try:
+            import imageio.v2 as imageio
+            imageio.mimsave(out_path, [np.asarray(frame) for frame in frames], fps=fps)
+            return out_path
+        except ImportError:
+            out_path = f"{os.path.splitext(out_path)[0]}.gif"
+            print(f"imageio not installed, writing {out_path} instead")
+    frames[0].save(out_path, save_all=True, append_images=frames[1:], duration=int(round(1000 / fps)), loop=0)
+    return out_path
+
+def render_prototype_animation(protos, out_path, fps, tile_size=480):
+    """
+    Draw one prototype (or a grid of several) frame by frame and encode it as GIF/MP4.
+    Runs in a worker; errors are returned as (out_path, message).
+    """
+    try:
+        n_cols = int(np.ceil(np.sqrt(len(protos))))
+        n_rows = int(np.ceil(len(protos) / n_cols))
+        font = ImageFont.load_default()
+        frames = []
+        for frame_i in range(max(p['n_frames'] for p in protos)):
+            sheet = Image.new('RGB', (n_cols * tile_size, n_rows * tile_size), 'white')
+            for k, proto in enumerate(protos):
+                tile = _render_prototype_tile(proto, frame_i, tile_size, font)
+                sheet.paste(tile, ((k % n_cols) * tile_size, (k // n_cols) * tile_size))
+            frames.append(sheet)
+        return _write_animation(frames, out_path, fps), None
+    except Exception as e:
+        return out_path, f"{type(e).__name__}: {e}"
+
 def generate_prototype_animations(
-    df, 
+    pose_view, 
     labels, 
     probs, 
     file_feature_lengths,
@@ -411,96 +610,61 @@ def generate_prototype_animations(
     output_dir="./prototypes", 
     fps=10, 
     n_prototypes=5,
-    min_distance_frames=30
+    min_distance_frames=30,
+    layout: Literal['single', 'grid'] = 'single',
+    out_format: Literal['gif', 'mp4'] = 'gif',
+    tile_size=480,
+    n_jobs=-1
 ):
-
-    if labels is None or df is None:
+    """
+    Pick the most confident, well-separated frames of every cluster and animate the spine chain
+    of each individual around them. Frames are drawn directly with PIL and encoded in a worker
+    pool, one task per animation. layout='single' writes one file per prototype, layout='grid'
+    one contact sheet per cluster with all its prototypes side by side.
+    """
+
+    if labels is None or pose_view is None:
         return
     os.makedirs(output_dir, exist_ok=True)
     unique_clusters = np.unique(labels)
     unique_clusters = unique_clusters[unique_clusters != -1]
     print(f"Generating {n_prototypes} prototypes per cluster for: {unique_clusters}")
 
-    individuals = df.columns.get_level_values(0).unique()
+    individuals = pose_view.columns.get_level_values(0).unique()
     SPINE_CHAIN = ['Snout', 'Center', 'Tail(base)']
 
-    pose_data_cache = {}
+    # Individuals with a complete spine chain; their windows are fetched lazily per prototype
+    spine_cols = {}
     for ind in individuals:
-        pose_data_cache[ind] = {}
-        for bp in SPINE_CHAIN:
-            if (ind, bp, 'x') in df.columns and (ind, bp, 'y') in df.columns:
-                pose_data_cache[ind][bp] = {
-                    'x': df[(ind, bp, 'x')].values,
-                    'y': df[(ind, bp, 'y')].values
-                }
+        if all((ind, bp, c) in pose_view.columns for bp in SPINE_CHAIN for c in ('x', 'y')):
+            spine_cols[ind] = [(ind, bp, 'x') for bp in SPINE_CHAIN] + [(ind, bp, 'y') for bp in SPINE_CHAIN]
 
     cum_file_lengths = np.cumsum([0] + file_feature_lengths)
-    file_bout_feat_bounds = [] 
-    
-    for file_idx in range(len(file_feature_lengths)):
-        pose_indices = all_mask_indices[file_idx]
-        raw_bouts = indices_to_spans(pose_indices)
-
-        feat_bounds = []
-        for b_start, b_end in raw_bouts:
-            local_start = np.searchsorted(pose_indices, b_start, side='left')
-            local_end = np.searchsorted(pose_indices, b_end, side='right') - 1
-            if local_start > local_end: continue # Skip empty
-            
-            g_start = cum_file_lengths[file_idx] + local_start
-            g_end = cum_file_lengths[file_idx] + local_end
-            feat_bounds.append((g_start, g_end))
-            
-        file_bout_feat_bounds.append(feat_bounds)
+    bout_starts, bout_ends = bout_feature_bounds(all_mask_indices, file_feature_lengths)
+    window_frames = int(fps * 1.5)
+    render_tasks = []
 
     for cluster_id in unique_clusters:
         cluster_global_indices = np.where(labels == cluster_id)[0]
         if len(cluster_global_indices) == 0:
             continue
 
-        candidates = []
-        for global_idx in cluster_global_indices:
-            file_idx = np.searchsorted(cum_file_lengths, global_idx, side='right') - 1
-            prob_val = probs[global_idx, cluster_id]
-            
-            bout_start, bout_end = global_idx, global_idx
-            for g_start, g_end in file_bout_feat_bounds[file_idx]:
-                if g_start <= global_idx <= g_end:
-                    bout_start, bout_end = g_start, g_end
-                    break
-                    
-            candidates.append({
-                'global_idx': global_idx,
-                'file_idx': file_idx,
-                'prob': prob_val,
-                'bout_start': bout_start,
-                'bout_end': bout_end
-            })
-            
-        candidates.sort(key=lambda x: x['prob'], reverse=True)
-        
-        selected = []
-        last_selected_per_file = {}
-        
-        for cand in candidates:
-            if len(selected) >= n_prototypes:
-                break
-            
-            file_idx = cand['file_idx']
-            global_idx = cand['global_idx']
-            
-            if file_idx in last_selected_per_file:
-                dist = abs(global_idx - last_selected_per_file[file_idx])
-                if dist < min_distance_frames:
-                    continue # Too close, skip
-            
-            window_frames = int(fps * 1.5)
-            if (global_idx - window_frames) < cand['bout_start'] or \
-               (global_idx + window_frames) > cand['bout_end']:
-                continue
-                
-            selected.append(cand)
-            last_selected_per_file[file_idx] = global_idx
+        file_ids = np.searchsorted(cum_file_lengths, cluster_global_indices, side='right') - 1
+        bout_ids = np.searchsorted(bout_starts, cluster_global_indices, side='right') - 1
+        cluster_probs = probs[cluster_global_indices, cluster_id]
+
+        picks = select_prototype_candidates(
+            cluster_global_indices, cluster_probs, file_ids,
+            bout_starts[bout_ids], bout_ends[bout_ids],
+            n_prototypes, min_distance_frames, window_frames
+        )
+        selected = [{
+            'global_idx': cluster_global_indices[i],
+            'file_idx': file_ids[i],
+            'prob': cluster_probs[i],
+            'bout_start': bout_starts[bout_ids[i]],
+            'bout_end': bout_ends[bout_ids[i]]
+        } for i in picks]
 
         if not selected:
             print(f"Cluster {cluster_id}: No valid prototypes found.")
@@ -508,104 +672,77 @@ def generate_prototype_animations(
             
         print(f"Cluster {cluster_id}: Selected {len(selected)} prototypes")
 
+        protos = []
         for proto_idx, cand in enumerate(selected):
             center_feat_idx = cand['global_idx']
             prob_val = cand['prob']
-            file_idx = cand['file_idx']
             
-            window_frames = int(fps * 1.5)
             anim_start = max(cand['bout_start'], center_feat_idx - window_frames)
             anim_end = min(cand['bout_end'], center_feat_idx + window_frames)
             
-            anim_xs = {}
-            anim_ys = {}
-            valid_individuals = []
-            
-            for ind in individuals:
-                if ind not in pose_data_cache: continue
-                ind_data = pose_data_cache[ind]
-                if not all(bp in ind_data for bp in SPINE_CHAIN): continue
-                
-                try:
-                    xs_slice = np.array([ind_data[bp]['x'][anim_start:anim_end+1] for bp in SPINE_CHAIN]).T
-                    ys_slice = np.array([ind_data[bp]['y'][anim_start:anim_end+1] for bp in SPINE_CHAIN]).T
-                    if np.all(np.isnan(xs_slice)): continue
-                    
-                    anim_xs[ind] = xs_slice
-                    anim_ys[ind] = ys_slice
-                    valid_individuals.append(ind)
-                except IndexError:
-                    continue
-
-            if not valid_individuals:
+            tracks = []
+            n_bp = len(SPINE_CHAIN)
+            for ind, cols in spine_cols.items():
+                window = pose_view.window(anim_start, anim_end, cols)
+                xs_slice, ys_slice = window[:, :n_bp], window[:, n_bp:]
+                if np.all(np.isnan(xs_slice)): continue
+                tracks.append((str(ind), xs_slice, ys_slice))
+
+            if not tracks:
                 continue
 
-            all_x = np.concatenate([anim_xs[ind].flatten() for ind in valid_individuals])
-            all_y = np.concatenate([anim_ys[ind].flatten() for ind in valid_individuals])
+            all_x = np.concatenate([xs.flatten() for _, xs, _ in tracks])
+            all_y = np.concatenate([ys.flatten() for _, _, ys in tracks])
             valid_x = all_x[~np.isnan(all_x)]
             valid_y = all_y[~np.isnan(all_y)]
             
             if len(valid_x) == 0: continue
 
             margin = 50
-            min_x, max_x = np.min(valid_x) - margin, np.max(valid_x) + margin
-            min_y, max_y = np.min(valid_y) - margin, np.max(valid_y) + margin
-
-            fig, ax = plt.subplots(figsize=(8, 8))
-            ax.set_title(f"Cluster {cluster_id} | Proto #{proto_idx+1} | Conf: {prob_val:.3f}")
-            ax.set_xlim(min_x, max_x)
-            ax.set_ylim(max_y, min_y)
-            ax.set_aspect('equal')
-            
-            lines = {}
-            texts = {}
-            artist_list = []
-            
-            for ind in valid_individuals:
-                xs_init = anim_xs[ind][0, :]
-                ys_init = anim_ys[ind][0, :]
-                
-                line, = ax.plot(xs_init, ys_init, 'o-', label=str(ind), markersize=5, linewidth=2)
-                lines[ind] = line
-                artist_list.append(line)
-                
-                cx, cy = np.nanmean(xs_init), np.nanmean(ys_init)
-                text = ax.text(cx, cy, str(ind), fontsize=10, bbox=dict(facecolor='white', alpha=0.7))
-                texts[ind] = text
-                artist_list.append(text)
-
-            def animate(frame_i):
-                for ind in valid_individuals:
-                    xs = anim_xs[ind][frame_i, :]
-                    ys = anim_ys[ind][frame_i, :]
-                    lines[ind].set_data(xs, ys)
-                    cx, cy = np.nanmean(xs), np.nanmean(ys)
-                    if not np.isnan(cx):
-                        texts[ind].set_position((cx, cy))
-                return artist_list
-
-            n_frames = anim_end - anim_start + 1
-            ani = animation.FuncAnimation(fig, animate, frames=n_frames, interval=1000/fps, blit=True)
-            
-            out_path = os.path.join(output_dir, f"cluster_{cluster_id}_proto_{proto_idx+1:02d}.gif")
-            try:
-                ani.save(out_path, writer='pillow', fps=fps)
-            except Exception as e:
-                print(f"Error saving {out_path}: {e}")
-            finally:
-                plt.close(fig)
-                
-        print(f"Saved {len(selected)} prototypes for Cluster {cluster_id}")
+            title = f"Proto #{proto_idx+1} | Conf: {prob_val:.3f}"
+            protos.append({
+                'title': title if layout == 'grid' else f"Cluster {cluster_id} | {title}",
+                'bounds': (np.min(valid_x) - margin, np.max(valid_x) + margin,
+                           np.min(valid_y) - margin, np.max(valid_y) + margin),
+                'n_frames': anim_end - anim_start + 1,
+                'tracks': tracks,
+                'out_path': os.path.join(output_dir, f"cluster_{cluster_id}_proto_{proto_idx+1:02d}.{out_format}")
+            })
 
-def analyze_transitions(labels):
-    unique_labels = np.unique(labels)
-    n = len(labels)
-    trans_counts = np.zeros((len(unique_labels), len(unique_labels)))
-    for i in range(n - 1):
-        if labels[i] in unique_labels and labels[i+1] in unique_labels:
-            idx_i = np.where(unique_labels == labels[i])[0][0]
-            idx_j = np.where(unique_labels == labels[i+1])[0][0]
-            trans_counts[idx_i, idx_j] += 1
+        if layout == 'grid' and protos:
+            render_tasks.append((protos, os.path.join(output_dir, f"cluster_{cluster_id}_prototypes.{out_format}")))
+        else:
+            render_tasks.extend(([p], p['out_path']) for p in protos)
+
+    with Parallel(n_jobs=n_jobs) as pool:
+        results = pool(
+            delayed(render_prototype_animation)(task_protos, out_path, fps, tile_size)
+            for task_protos, out_path in render_tasks
+        )
+    for out_path, error in results:
+        if error is not None:
+            print(f"Error saving {out_path}: {error}")
+    print(f"Saved {sum(error is None for _, error in results)} animations to {output_dir}")
+
+def count_transitions(labels, lengths=None):
+    """
+    Counts of consecutive label pairs as one bincount over dense indices i*K+j.
+    With lengths (sequence lengths summing to len(labels)), pairs spanning two sequences are not counted.
+    Returns (unique_labels, trans_counts[K, K])
+    """
+    unique_labels, dense = np.unique(labels, return_inverse=True)
+    n_states = len(unique_labels)
+    keep = np.ones(max(len(dense) - 1, 0), dtype=bool)
+    if lengths is not None:
+        seq_ends = np.cumsum(lengths)[:-1] - 1
+        keep[seq_ends[(seq_ends >= 0) & (seq_ends < len(keep))]] = False
+
+    pairs = dense[:-1][keep] * n_states + dense[1:][keep]
+    trans_counts = np.bincount(pairs, minlength=n_states * n_states).reshape(n_states, n_states)
+    return unique_labels, trans_counts.astype(float)
+
+def analyze_transitions(labels, lengths=None):
+    unique_labels, trans_counts = count_transitions(labels, lengths)
     
     row_sums = trans_counts.sum(axis=1, keepdims=True)
     row_sums[row_sums == 0] = 1
@@ -773,7 +910,8 @@ def export_clusters_to_asoid(
     selections: Dict[int, str],
     output_subdir: str = "cluster_exports",
     on_exists: str = 'merge', 
-    fps: int = 10
+    fps: int = 10,
+    pose_cache_dir: str = None
 ):
 
     if not selections:
@@ -797,8 +935,7 @@ def export_clusters_to_asoid(
 
         file_labels = clustered_labels[start_idx:end_idx]
 
-        df_pose = pd.read_csv(pose_file, header=[0, 1, 2])
-        total_frames = len(df_pose) - 1
+        total_frames = pose_frame_count(pose_file, pose_cache_dir) - 1
     
         print(f"\nProcessing: {os.path.basename(asoid_file)}")
         for cluster_id, behavior_name in selections.items():
@@ -842,6 +979,10 @@ if __name__ == "__main__":
     behavior = "mounting"
     window_size = 20
     feature_subset = "mounting"
+    min_angle_deg = 90.0
+    pose_cache_dir = os.path.join(pose_dir, "pose_cache")
+    feature_cache_dir = os.path.join(asoid_dir, "feature_cache")
+    n_jobs = -1
 
     pairs = load_annot_pose_pair(asoid_dir, pose_dir, max_files=999)
     n_pairs = len(pairs)
@@ -851,41 +992,34 @@ if __name__ == "__main__":
         print(f"Loaded {n_pairs} file pairs.")
 
         features_all = []
-        df_vis_list = []
+        pose_files_used = []
         feature_names = None
         all_mask_indices = []
         file_feature_lengths = []
         
-        pbar = tqdm(total=n_pairs, desc="Extracting Features", unit="file", ncols=100)
+        results = extract_features_parallel(pairs, behavior, window_size, feature_subset, pose_cache_dir,
+                                            min_angle_deg, feature_cache_dir, n_jobs=n_jobs)
 
-        for asoid_file, pose_file in pairs:
-            mask = extract_behavior_mask(asoid_file, behavior)
-            
-            try:
-                feats, df_raw_vis, fnames, final_mask = extract_features(pose_file, mask, window_size, feature_subset)
-                
-                if feats.shape[0] > 0:
-                    valid_indices = np.where(final_mask)[0]
-                    all_mask_indices.append(valid_indices)
-                    
-                    features_all.append(feats)
-                    df_vis_list.append(df_raw_vis)
-                    file_feature_lengths.append(feats.shape[0])
-
-                    if feature_names is None:
-                        feature_names = fnames
-            except Exception as e:
-                print(f"Error processing {pose_file}: {e}")
-            
-            pbar.update(1)
+        for (asoid_file, pose_file), (feats, fnames, valid_indices, error) in zip(pairs, results):
+            if error is not None:
+                print(f"Error processing {pose_file}: {error}")
+                continue
+
+            if feats.shape[0] > 0:
+                all_mask_indices.append(valid_indices)
+
+                features_all.append(feats)
+                pose_files_used.append(pose_file)
+                file_feature_lengths.append(feats.shape[0])
 
-        pbar.close()
+                if feature_names is None:
+                    feature_names = fnames
 
         if not features_all:
             print("No valid features extracted.")
         else:
             features_all = np.vstack(features_all)
-            df_vis = pd.concat(df_vis_list, ignore_index=True)
+            pose_view = PoseView(pose_files_used, all_mask_indices, pose_cache_dir)
             
             features_all = np.nan_to_num(features_all, nan=0.0, posinf=0.0, neginf=0.0)
             
@@ -910,16 +1044,16 @@ if __name__ == "__main__":
             )
             model.reg_covar = 1e-4 
             model.fit(features_norm)
-            labels = predict_with_bout_resets(
+            labels, probs = predict_with_bout_resets(
                     model, 
                     features_norm, 
                     all_mask_indices, 
                     file_feature_lengths, 
-                    min_gap_frames=10
+                    min_gap_frames=10,
+                    n_jobs=n_jobs
                 )
-            probs = model.predict_proba(features_norm)
 
-            analyze_transitions(labels)
+            analyze_transitions(labels, bout_lengths(all_mask_indices, file_feature_lengths, min_gap_frames=10))
 
             visualize_clustering_2d(
                 features_all, labels, 
@@ -936,12 +1070,13 @@ if __name__ == "__main__":
             )
 
             generate_prototype_animations(
-                df_vis, 
+                pose_view, 
                 labels, 
                 probs, 
                 n_prototypes=10,
                 file_feature_lengths=file_feature_lengths,
-                all_mask_indices=all_mask_indices)
+                all_mask_indices=all_mask_indices,
+                n_jobs=n_jobs)
 
             selections = interactive_cluster_selection(
                 labels, 
@@ -964,7 +1099,8 @@ if __name__ == "__main__":
                     selections=selections,
                     output_subdir=output_subdir,
                     on_exists=on_exists,
-                    fps=fps
+                    fps=fps,
+                    pose_cache_dir=pose_cache_dir
                 )
                 
                 print("Export complete! Check your ASOID directory for the new subfolder.")
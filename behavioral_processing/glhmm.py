@@ -1,17 +1,18 @@
 import os
 import json
-import glob
-import h5py
-import pickle
+import hashlib
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from typing import List, Tuple, Optional, Iterable
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score
 from sklearn.preprocessing import StandardScaler
+from joblib import Parallel, delayed
 from ssm import HMM
 
+from session_stream import DualRoleSessionStream, read_reference_map
+
 # =============================================================================
 # 1. SEGMENTATION & LOADING (UNCHANGED FROM YOUR PIPELINE)
 # =============================================================================
@@ -27,68 +28,66 @@ def array_to_iterable_runs(arr: np.ndarray) -> Iterable[Tuple[int, int, int]]:
 
 
 def split_by_neutral(seq: np.ndarray, neutral_ids: List[int], 
-                     min_gap: int = 10, max_length: int = 3000) -> List[Tuple[int, int]]:
-    """Split sequence into active segments bounded by neutral behaviors."""
-    for start, end, val in array_to_iterable_runs(seq):
-        if val not in neutral_ids:
-            continue
-        if end - start + 1 > min_gap:
-            continue
-        if start > 0:
-            seq[start:end+1] = seq[start-1]
-
-    is_neutral = np.isin(seq, neutral_ids)
-    boundaries = np.where(np.diff(is_neutral.astype(int)) != 0)[0] + 1
-    segments = []
-    start = 0
+                     min_gap: int = 10, max_length: int = 3000) -> np.ndarray:
+    """
+    Split sequence into active segments bounded by neutral behaviors.
     
-    for b in boundaries:
-        if is_neutral[start]:
-            start = b
-            continue
-        len_seg = b - start
-        if len_seg <= max_length:
-            segments.append((start, b))
-        else:
-            n_chunks = len_seg // max_length + 1
-            chunk_edges = np.linspace(start, b, n_chunks + 1, dtype=int)
-            for j in range(len(chunk_edges) - 1):
-                st, ed = int(chunk_edges[j]), int(chunk_edges[j + 1])
-                if st < ed:
-                    segments.append((st, ed))
-        start = b
-        
-    if start < len(seq) and not is_neutral[start]:
-        len_seg = len(seq) - start
-        if len_seg <= max_length:
-            segments.append((start, len(seq)))
-        else:
-            n_chunks = len_seg // max_length + 1
-            chunk_edges = np.linspace(start, len(seq), n_chunks + 1, dtype=int)
-            for j in range(len(chunk_edges) - 1):
-                st, ed = int(chunk_edges[j]), int(chunk_edges[j + 1])
-                if st < ed:
-                    segments.append((st, ed))
-    return segments
+    Neutral runs of at most min_gap frames (not at the sequence start) are filled in
+    place with the preceding behavior; active stretches longer than max_length are
+    cut into equal chunks. Returns an (n_segments, 2) array of [start, end) bounds.
+    """
+    n = len(seq)
+    if n == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    
+    # Run-length encode once
+    change_points = np.flatnonzero(seq[1:] != seq[:-1]) + 1
+    run_starts = np.concatenate(([0], change_points))
+    run_lengths = np.diff(np.append(run_starts, n))
+    run_vals = seq[run_starts]
+    
+    # Fill short neutral gaps: masked forward-fill over runs
+    run_neutral = np.isin(run_vals, neutral_ids)
+    fill = run_neutral & (run_lengths <= min_gap) & (run_starts > 0)
+    if fill.any():
+        src = np.where(fill, 0, np.arange(len(run_vals)))
+        np.maximum.accumulate(src, out=src)
+        run_vals = run_vals[src]
+        run_neutral = run_neutral[src]
+        seq[:] = np.repeat(run_vals, run_lengths)
+    
+    # Active stretches = maximal blocks of non-neutral runs
+    edges = np.diff(np.concatenate(([False], ~run_neutral, [False])).astype(np.int8))
+    bounds = np.append(run_starts, n)
+    act_starts = bounds[np.flatnonzero(edges == 1)]
+    act_ends = bounds[np.flatnonzero(edges == -1)]
+    
+    # Chunk long stretches (same edges as np.linspace(start, end, n_chunks + 1, dtype=int))
+    act_len = act_ends - act_starts
+    n_chunks = np.where(act_len <= max_length, 1, act_len // max_length + 1)
+    seg_owner = np.repeat(np.arange(len(act_starts)), n_chunks)
+    j = np.arange(len(seg_owner)) - np.repeat(np.cumsum(n_chunks) - n_chunks, n_chunks)
+    step = act_len[seg_owner] / n_chunks[seg_owner]
+    seg_starts = (j * step + act_starts[seg_owner]).astype(np.int64)
+    seg_ends = ((j + 1) * step + act_starts[seg_owner]).astype(np.int64)
+    last = j == n_chunks[seg_owner] - 1
+    seg_ends[last] = act_ends[seg_owner[last]]
+    
+    keep = seg_starts < seg_ends
+    return np.column_stack((seg_starts[keep], seg_ends[keep]))
+
 
 
 def load_dual_role_full_10hz(h5_dir: str, min_start: Optional[float] = None, 
-                            min_end: Optional[float] = None) -> Tuple:
-    """Load sessions and remap to role-agnostic vocabulary."""
-    h5_files = sorted(glob.glob(os.path.join(h5_dir, "*.h5")))
-    if not h5_files: 
-        raise ValueError("No .h5 files found.")
-    
-    with h5py.File(h5_files[0], 'r') as f:
-        ref_map = json.loads(f['/meta/behavior_map'][()])
-        fps = float(f['/meta'].attrs.get('fps', 10.0))
+                            min_end: Optional[float] = None, max_files: Optional[int] = None) -> Tuple:
+    """Stream sessions remapped to role-agnostic vocabulary (one file in memory at a time)."""
+    h5_files, ref_map, fps = read_reference_map(h5_dir)
         
     base_behaviors = sorted(set(name[4:] for name in ref_map if name.startswith(('dom_', 'sub_'))))
     vocab = sorted(list(set(base_behaviors + ['other'])))
     vocab_map = {v: i for i, v in enumerate(vocab)}
     idx_to_name = {i: n for n, i in vocab_map.items()}
     
-    dom_seqs, sub_seqs, file_ids = [], [], []
     other_id = vocab_map['other']
     
     dom_remap = np.full(len(ref_map), -1, dtype=int)
@@ -104,71 +103,131 @@ def load_dual_role_full_10hz(h5_dir: str, min_start: Optional[float] = None,
             dom_remap[orig_idx] = other_id
             sub_remap[orig_idx] = other_id
             
-    for f in h5_files:
-        with h5py.File(f, 'r') as hf:
-            arr = hf['/data/behaviors'][:].flatten()
-            fid = os.path.basename(f)
-        total = len(arr)
-        s = int((min_start or 0) * 60 * fps)
-        e = int((min_end or total / 60 / fps) * 60 * fps)
-        arr = arr[max(0,s):min(total,e)]
-        dom_seqs.append(dom_remap[arr].astype(int))
-        sub_seqs.append(sub_remap[arr].astype(int))
-        file_ids.append(fid)
-        if len(file_ids) >= 2:  # For testing
-            break
-    return dom_seqs, sub_seqs, file_ids, idx_to_name, vocab_map, fps, other_id
+    sessions = DualRoleSessionStream(h5_files, dom_remap, sub_remap, fps, len(vocab),
+                                     min_start, min_end, max_files)
+    return sessions, idx_to_name, vocab_map, fps, other_id
 
 # =============================================================================
 # 2. SEGMENT → VECTOR CONVERSION (UNCHANGED)
 # =============================================================================
 
-def compute_segment_vectors(dom_seqs, sub_seqs, file_ids, neutral_ids, fps, vocab_size):
-    """Convert active segments to proportion vectors + metadata."""
-    vectors, meta_rows = [], []
-    for seq, fid, track in zip(dom_seqs + sub_seqs, file_ids*2, ['dom']*len(file_ids) + ['sub']*len(file_ids)):
+def _iter_tracks(sessions: Iterable) -> Iterable[Tuple[np.ndarray, str, str]]:
+    for fid, dom_seq, sub_seq in sessions:
+        yield dom_seq, fid, 'dom'
+        yield sub_seq, fid, 'sub'
+
+
+SEGMENT_META_COLUMNS = ['session_id', 'track', 'start_frame', 'end_frame',
+                        'duration_sec', 'start_min', 'end_min']
+
+
+def compute_segment_vectors(sessions, neutral_ids, fps, vocab_size, min_frames=20):
+    """
+    Convert active segments to proportion vectors + columnar metadata, one streamed session at a time.
+    
+    All segment vectors of a track come from a single prefix-sum table, so there is
+    no per-segment Python work.
+    """
+    vectors, meta_cols = [], {k: [] for k in ('session_id', 'track', 'start_frame', 'end_frame')}
+    for seq, fid, track in _iter_tracks(sessions):
         segments = split_by_neutral(seq, neutral_ids)
-        for start, end in segments:
-            seg = seq[start:end]
-            if len(seg) < 20: 
-                continue
-            counts = np.bincount(seg, minlength=vocab_size)
-            props = counts / len(seg)
-            vectors.append(props)
-            meta_rows.append({
-                'session_id': fid, 'track': track, 'start_frame': start, 'end_frame': end,
-                'duration_sec': len(seg) / fps, 'start_min': start / (60 * fps), 'end_min': end / (60 * fps)
-            })
-    return np.array(vectors), pd.DataFrame(meta_rows)
+        segments = segments[segments[:, 1] - segments[:, 0] >= min_frames]
+        if len(segments) == 0:
+            continue
+        
+        # Per-behavior prefix counts: counts in [s, e) = cum[e] - cum[s]
+        # Unassigned frames (label -1) count towards no behavior instead of wrapping to the last column
+        cum = np.zeros((len(seq) + 1, vocab_size), dtype=np.int32)
+        assigned = seq >= 0
+        cum[np.arange(1, len(seq) + 1)[assigned], seq[assigned]] = 1
+        np.cumsum(cum, axis=0, out=cum)
+        
+        starts, ends = segments[:, 0], segments[:, 1]
+        counts = cum[ends] - cum[starts]
+        vectors.append(counts / (ends - starts)[:, None])
+        
+        meta_cols['session_id'].append(np.full(len(segments), fid, dtype=object))
+        meta_cols['track'].append(np.full(len(segments), track, dtype=object))
+        meta_cols['start_frame'].append(starts)
+        meta_cols['end_frame'].append(ends)
+    
+    if not vectors:
+        return np.empty((0, vocab_size)), pd.DataFrame(columns=SEGMENT_META_COLUMNS)
+    
+    X = np.concatenate(vectors)
+    meta = pd.DataFrame({k: np.concatenate(v) for k, v in meta_cols.items()})
+    meta['duration_sec'] = (meta['end_frame'] - meta['start_frame']) / fps
+    meta['start_min'] = meta['start_frame'] / (60 * fps)
+    meta['end_min'] = meta['end_frame'] / (60 * fps)
+    return X, meta
 
 # =============================================================================
 # 3. CLUSTERING (UNCHANGED)
 # =============================================================================
 
+def _fit_and_score_k(X_sub: np.ndarray, k: int, minibatch: bool, batch_size: int, random_state: int) -> dict:
+    """Fit one sweep model and score it with silhouette, inertia and Calinski-Harabasz."""
+    if minibatch:
+        km = MiniBatchKMeans(n_clusters=k, init='k-means++', n_init=3, max_iter=300,
+                             batch_size=batch_size, random_state=random_state)
+    else:
+        km = KMeans(n_clusters=k, init='k-means++', n_init=10, max_iter=300, random_state=random_state)
+    km.fit(X_sub)
+    return {
+        'k': k,
+        'silhouette': silhouette_score(X_sub, km.labels_),
+        'inertia': km.inertia_,
+        'calinski_harabasz': calinski_harabasz_score(X_sub, km.labels_),
+        'centers': km.cluster_centers_
+    }
+
+
 def optimize_and_cluster(X: np.ndarray, k_range: range = range(3, 10), 
-                         silhouette_sample=15000, random_state=42):
-    """Find optimal k using silhouette on a subsample, then fit KMeans on full data."""
+                         silhouette_sample=15000, random_state=42,
+                         criterion: str = 'silhouette', minibatch: bool = False,
+                         batch_size: int = 4096, n_jobs: int = -1):
+    """
+    Find optimal k on a subsample, then fit KMeans on full data.
+    
+    The k sweep runs in parallel (optionally with MiniBatchKMeans for large segment sets);
+    criterion picks k by 'silhouette' or 'calinski_harabasz' (higher is better), inertia is
+    reported for elbow inspection. The final full-data KMeans is warm-started from the
+    winning sweep model's centroids.
+    Returns: final_labels, best_k, silhouette_scores_dict, sweep_scores_df
+    """
+    if criterion not in ('silhouette', 'calinski_harabasz'):
+        raise ValueError(f"Unknown criterion: {criterion}. Use 'silhouette' or 'calinski_harabasz'.")
+    
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
+    
+    # 1. Subsample for efficient model selection
     if len(X_scaled) > silhouette_sample:
         rng = np.random.RandomState(random_state)
         sub_idx = rng.choice(len(X_scaled), silhouette_sample, replace=False)
         X_sub = X_scaled[sub_idx]
     else:
         X_sub = X_scaled
-    best_k, best_score, silhouette_scores = None, -1.0, {}
-    for k in k_range:
-        km = KMeans(n_clusters=k, init='k-means++', n_init=10, max_iter=300, random_state=random_state)
-        km.fit(X_sub)
-        score = silhouette_score(X_sub, km.labels_)
-        silhouette_scores[k] = score
-        print(f"  k={k:2d} | Silhouette (n={silhouette_sample}) = {score:.4f}")
-        if score > best_score:
-            best_score, best_k = score, k
-    print(f"✅ Optimal k = {best_k} (Silhouette = {best_score:.4f})")
-    final_km = KMeans(n_clusters=best_k, init='k-means++', n_init=10, max_iter=300, random_state=random_state)
+    
+    sweep = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score_k)(X_sub, k, minibatch, batch_size, random_state) for k in k_range
+    )
+    for r in sweep:
+        print(f"  k={r['k']:2d} | Silhouette (n={len(X_sub)}) = {r['silhouette']:.4f} | "
+              f"CH = {r['calinski_harabasz']:.1f} | Inertia = {r['inertia']:.1f}")
+    
+    best = max(sweep, key=lambda r: r[criterion])
+    best_k = best['k']
+    silhouette_scores = {r['k']: r['silhouette'] for r in sweep}
+    sweep_df = pd.DataFrame([{key: v for key, v in r.items() if key != 'centers'} for r in sweep])
+    print(f"✅ Optimal k = {best_k} ({criterion} = {best[criterion]:.4f})")
+    
+    # 2. Fit final model on FULL dataset, seeded with the winning sweep centroids
+    final_km = KMeans(n_clusters=best_k, init=best['centers'], n_init=1, max_iter=300,
+                      random_state=random_state)
     final_labels = final_km.fit_predict(X_scaled)
-    return final_labels, best_k, silhouette_scores
+    
+    return final_labels, best_k, silhouette_scores, sweep_df
 
 # =============================================================================
 # 8. GLM-HMM: CHAMBER-AWARE INPUT BUILDING
@@ -255,12 +314,33 @@ def pool_sessions_for_glmhmm(segment_labels_list: List[np.ndarray],
 # 9. GLM-HMM: MODEL FITTING & CROSS-VALIDATION
 # =============================================================================
 
+def _build_glmhmm(num_states: int, input_dim: int, prior_sigma: Optional[float] = None,
+                  prior_alpha: Optional[float] = None) -> 'HMM':
+    """Instantiate an unfitted binary-choice GLM-HMM."""
+    # Configure observation and transition models
+    obs_kwargs = dict(C=2)  # Binary choice
+    if prior_sigma is not None:
+        obs_kwargs['prior_sigma'] = prior_sigma
+    
+    if prior_alpha is not None:
+        # Use "sticky" transitions with kappa=0 to get Dirichlet prior without stickiness
+        trans_type, trans_kwargs = "sticky", dict(alpha=prior_alpha, kappa=0)
+    else:
+        trans_type, trans_kwargs = "standard", {}
+    
+    return HMM(
+        num_states, 1, input_dim,
+        observations="input_driven_obs", observation_kwargs=obs_kwargs,
+        transitions=trans_type, transition_kwargs=trans_kwargs
+    )
+
+
 def fit_glmhmm(all_choices: List[np.ndarray], all_inputs: List[np.ndarray], 
               num_states: int, input_dim: int, 
               method: str = 'em', prior_sigma: Optional[float] = None,
               prior_alpha: Optional[float] = None,
               num_iters: int = 200, tolerance: float = 1e-4,
-              random_state: int = 42) -> 'HMM':
+              random_state: int = 42, init_params: Optional[tuple] = None) -> 'HMM':
     """
     Fit a GLM-HMM using the ssm package.
     
@@ -286,60 +366,118 @@ def fit_glmhmm(all_choices: List[np.ndarray], all_inputs: List[np.ndarray],
         Convergence tolerance for EM
     random_state : int, default=42
         Random seed for reproducibility
+    init_params : tuple, optional
+        Warm start: ssm parameter tuple (model.params of a previous fit, or the
+        output of split_glmhmm_state). EM then skips its random initialization.
         
     Returns:
     --------
     model : HMM
         Fitted GLM-HMM model
+    ll_trace : list
+        Log-likelihood per EM iteration (len(ll_trace) - 1 iterations to convergence)
     """
     np.random.seed(random_state)
     
-    # Configure observation and transition models
-    obs_kwargs = dict(C=2)  # Binary choice
-    if prior_sigma is not None:
-        obs_kwargs['prior_sigma'] = prior_sigma
-    
-    if prior_alpha is not None:
-        # Use "sticky" transitions with kappa=0 to get Dirichlet prior without stickiness
-        trans_type, trans_kwargs = "sticky", dict(alpha=prior_alpha, kappa=0)
-    else:
-        trans_type, trans_kwargs = "standard", {}
-    
-    # Instantiate model
-    model = HMM(
-        num_states, 1, input_dim,
-        observations="input_driven_obs", observation_kwargs=obs_kwargs,
-        transitions=trans_type, transition_kwargs=trans_kwargs
-    )
+    model = _build_glmhmm(num_states, input_dim, prior_sigma, prior_alpha)
     
-    # Fit model
+    # Fit model (warm-started models keep their seeded parameters)
+    if init_params is not None:
+        model.params = init_params
     ll_trace = model.fit(
         all_choices, inputs=all_inputs, method=method,
-        num_iters=num_iters, tolerance=tolerance
+        num_iters=num_iters, tolerance=tolerance,
+        initialize=init_params is None
     )
     
-    print(f"✅ GLM-HMM fitted: {num_states} states, final log-likelihood = {ll_trace[-1]:.2f}")
+    start = "warm" if init_params is not None else "cold"
+    print(f"✅ GLM-HMM fitted: {num_states} states, final log-likelihood = {ll_trace[-1]:.2f} "
+          f"({len(ll_trace) - 1} EM iterations, {start} start)")
     return model, ll_trace
 
 
+def split_glmhmm_state(params: tuple, jitter: float = 0.1, random_state: int = 42) -> tuple:
+    """
+    Seed a (K+1)-state GLM-HMM from a fitted K-state solution.
+    
+    The state with the highest stationary occupancy is split in two: its initial
+    and incoming transition mass is halved between the copies, the new state
+    inherits its outgoing transitions, and the GLM weights of the pair are pushed
+    apart by symmetric Gaussian jitter so EM can separate them.
+    
+    Parameters:
+    -----------
+    params : tuple
+        model.params of the fitted K-state GLM-HMM
+    jitter : float, default=0.1
+        Perturbation scale relative to the weight standard deviation
+    random_state : int, default=42
+        Random seed for the perturbation
+        
+    Returns:
+    --------
+    params : tuple
+        ssm parameter tuple for a (K+1)-state model, usable as fit_glmhmm(init_params=...)
+    """
+    (log_pi0,), (log_Ps,), Wk = params
+    K = len(log_pi0)
+    rng = np.random.default_rng(random_state)
+    
+    # Split the most occupied state under the stationary distribution
+    Ps = np.exp(log_Ps)
+    evals, evecs = np.linalg.eig(Ps.T)
+    stationary = np.abs(np.real(evecs[:, np.argmin(np.abs(evals - 1))]))
+    k = int(np.argmax(stationary))
+    
+    pi0 = np.append(np.exp(log_pi0), 0.0)
+    pi0[[k, K]] = pi0[k] / 2
+    
+    Ps_new = np.zeros((K + 1, K + 1))
+    Ps_new[:K, :K] = Ps
+    Ps_new[K, :K] = Ps[k]
+    Ps_new[:, K] = Ps_new[:, k] / 2
+    Ps_new[:, k] /= 2
+    
+    noise = jitter * (np.std(Wk) or 1.0) * rng.standard_normal(Wk[k].shape)
+    Wk_new = np.concatenate([Wk, Wk[k:k + 1]], axis=0)
+    Wk_new[k] -= noise
+    Wk_new[K] += noise
+    
+    eps = 1e-16
+    return (np.log(pi0 + eps),), (np.log(Ps_new + eps),), Wk_new
+
+
 def cross_validate_glmhmm(all_choices: List[np.ndarray], all_inputs: List[np.ndarray],
                          num_states: int, input_dim: int, 
                          num_folds: int = 5, random_state: int = 42,
                          prior_sigma: Optional[float] = None,
-                         prior_alpha: Optional[float] = None) -> Tuple[float, float]:
+                         prior_alpha: Optional[float] = None,
+                         num_iters: int = 100,
+                         fold_init_params: Optional[List[Optional[tuple]]] = None
+                         ) -> Tuple[float, float, float, List[Optional[tuple]]]:
     """
     Leave-one-session-out cross-validation for GLM-HMM hyperparameter selection.
     
+    Folds are deterministic for a given (n_sessions, num_folds, random_state), so the
+    params returned for one K line up with the folds of the next K. fold_init_params
+    (one entry per fold, None = random init) lets each fold warm-start from its own
+    training-split solution, e.g. split_glmhmm_state of the fold's (K-1)-state fit;
+    held-out sessions never contribute to a fold's initialization.
+    
     Returns:
     --------
     mean_test_ll : float
         Mean test log-likelihood across folds
     std_test_ll : float
         Standard deviation of test log-likelihood
+    mean_iters : float
+        Mean number of EM iterations to convergence across folds
+    fold_params : list
+        model.params of every fold's training fit (None for skipped folds)
     """
     np.random.seed(random_state)
     n_sessions = len(all_choices)
-    cv_scores = []
+    cv_scores, cv_iters = [], []
     
     # Simple leave-one-out if num_folds >= n_sessions
     if num_folds >= n_sessions:
@@ -353,19 +491,23 @@ def cross_validate_glmhmm(all_choices: List[np.ndarray], all_inputs: List[np.nda
             for f in range(num_folds)
         ]
     
-    for train_idx, test_idx in fold_indices:
+    fold_params = [None] * len(fold_indices)
+    for fold, (train_idx, test_idx) in enumerate(fold_indices):
         # Skip if test set is empty
         if len(test_idx) == 0:
             continue
             
         # Train model
-        model, _ = fit_glmhmm(
+        model, ll_trace = fit_glmhmm(
             [all_choices[i] for i in train_idx],
             [all_inputs[i] for i in train_idx],
             num_states, input_dim,
             prior_sigma=prior_sigma, prior_alpha=prior_alpha,
-            num_iters=100, random_state=random_state
+            num_iters=num_iters, random_state=random_state,
+            init_params=fold_init_params[fold] if fold_init_params is not None else None
         )
+        fold_params[fold] = model.params
+        cv_iters.append(len(ll_trace) - 1)
         
         # Evaluate on test set
         if len(test_idx) > 0:
@@ -376,15 +518,165 @@ def cross_validate_glmhmm(all_choices: List[np.ndarray], all_inputs: List[np.nda
             cv_scores.append(test_ll)
     
     if len(cv_scores) == 0:
-        return -np.inf, np.inf
-    return np.mean(cv_scores), np.std(cv_scores)
+        return -np.inf, np.inf, 0.0, fold_params
+    return np.mean(cv_scores), np.std(cv_scores), np.mean(cv_iters), fold_params
+
+
+def save_glmhmm(model: 'HMM', path_prefix: str, config: Optional[dict] = None,
+                prior_sigma: Optional[float] = None, prior_alpha: Optional[float] = None):
+    """
+    Save a fitted GLM-HMM as a parameter-only .npz/.json pair.
+    
+    Only the initial-state and transition log-probabilities and the GLM weights are
+    stored (path_prefix.npz); K, input_dim, priors and the pipeline config go to
+    path_prefix.json. Nothing is pickled, so the files survive ssm upgrades.
+    
+    Parameters:
+    -----------
+    model : HMM
+        Fitted GLM-HMM model
+    path_prefix : str
+        Output path without extension
+    config : dict, optional
+        JSON-serializable pipeline settings stored alongside (e.g. max_lag, num_segment_types)
+    prior_sigma, prior_alpha : float, optional
+        Priors the model was fitted with, needed to rebuild an identical model
+    """
+    np.savez_compressed(
+        f"{path_prefix}.npz",
+        log_pi0=model.init_state_distn.log_pi0,
+        log_Ps=model.transitions.log_Ps,
+        weights=model.observations.params
+    )
+    header = {
+        'num_states': int(model.K),
+        'input_dim': int(model.M),
+        'prior_sigma': prior_sigma,
+        'prior_alpha': prior_alpha,
+        'config': config or {}
+    }
+    with open(f"{path_prefix}.json", 'w') as f:
+        json.dump(header, f, indent=2)
+
+
+def load_glmhmm(path_prefix: str) -> Tuple['HMM', dict]:
+    """
+    Rebuild a GLM-HMM saved by save_glmhmm, ready for expected_states / most_likely_states.
+    
+    Returns:
+    --------
+    model : HMM
+        GLM-HMM with the stored parameters (no refitting)
+    config : dict
+        Pipeline settings stored with the model
+    """
+    with open(f"{path_prefix}.json", 'r') as f:
+        header = json.load(f)
+    model = _build_glmhmm(header['num_states'], header['input_dim'],
+                          header['prior_sigma'], header['prior_alpha'])
+    with np.load(f"{path_prefix}.npz") as data:
+        model.params = ((data['log_pi0'],), (data['log_Ps'],), data['weights'])
+    return model, header['config']
 
 # =============================================================================
-# 10. GLM-HMM: VISUALIZATION & INTERPRETATION
+# 10. GLM-HMM: POSTERIOR CACHE
 # =============================================================================
 
-def plot_state_probabilities_over_time(model: 'HMM', all_choices: List[np.ndarray],
-                                       all_inputs: List[np.ndarray], 
+def _session_posterior(model: 'HMM', choices: np.ndarray, inputs: np.ndarray) -> np.ndarray:
+    return model.expected_states(data=choices, input=inputs)[0]
+
+
+def _glmhmm_fingerprint(model: 'HMM', all_choices: List[np.ndarray],
+                        all_inputs: List[np.ndarray]) -> str:
+    """Hash of fitted parameters and data, used to invalidate stale posterior files."""
+    h = hashlib.sha1()
+    for arr in [model.init_state_distn.log_pi0, model.transitions.log_Ps, model.observations.params]:
+        h.update(np.ascontiguousarray(arr).tobytes())
+    for ch, inp in zip(all_choices, all_inputs):
+        h.update(np.ascontiguousarray(ch).tobytes())
+        h.update(np.ascontiguousarray(inp).tobytes())
+    return h.hexdigest()
+
+
+class PosteriorCache:
+    """
+    Posterior state probabilities of every session under one fitted GLM-HMM.
+    
+    The forward-backward pass runs once per session; diagnostics, plots and the
+    permutation test all read from this object. Indexing and iteration follow
+    the session order of all_choices / all_inputs.
+    """
+
+    def __init__(self, posteriors: List[np.ndarray], fingerprint: str = ""):
+        self.posteriors = posteriors
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.posteriors)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        return self.posteriors[idx]
+
+    def __iter__(self):
+        return iter(self.posteriors)
+
+    @property
+    def num_states(self) -> int:
+        return self.posteriors[0].shape[1]
+
+    @classmethod
+    def from_model(cls, model: 'HMM', all_choices: List[np.ndarray], all_inputs: List[np.ndarray],
+                   n_jobs: int = 1, cache_path: Optional[str] = None) -> 'PosteriorCache':
+        """
+        Compute posteriors for all sessions, or reload them from cache_path if it
+        was written for the same model parameters and data.
+        
+        Parameters:
+        -----------
+        model : HMM
+            Fitted GLM-HMM model
+        all_choices, all_inputs : lists of arrays
+            Sessions to decode
+        n_jobs : int, default=1
+            Number of joblib workers for the per-session forward-backward passes
+        cache_path : str, optional
+            .npz file to load from / persist to
+        """
+        fingerprint = _glmhmm_fingerprint(model, all_choices, all_inputs)
+        if cache_path is not None and os.path.isfile(cache_path):
+            cached = cls.load(cache_path)
+            if cached.fingerprint == fingerprint:
+                print(f"♻️ Loaded cached posteriors from {os.path.basename(cache_path)}")
+                return cached
+
+        if n_jobs == 1:
+            posteriors = [_session_posterior(model, ch, inp) for ch, inp in zip(all_choices, all_inputs)]
+        else:
+            posteriors = Parallel(n_jobs=n_jobs)(
+                delayed(_session_posterior)(model, ch, inp) for ch, inp in zip(all_choices, all_inputs)
+            )
+
+        cache = cls(posteriors, fingerprint)
+        if cache_path is not None:
+            cache.save(cache_path)
+        return cache
+
+    def save(self, path: str):
+        lengths = np.array([len(p) for p in self.posteriors], dtype=np.int64)
+        np.savez_compressed(path, posteriors=np.concatenate(self.posteriors),
+                            lengths=lengths, fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path: str) -> 'PosteriorCache':
+        with np.load(path) as data:
+            posteriors = np.split(data['posteriors'], np.cumsum(data['lengths'])[:-1])
+            return cls(posteriors, str(data['fingerprint']))
+
+# =============================================================================
+# 11. GLM-HMM: VISUALIZATION & INTERPRETATION
+# =============================================================================
+
+def plot_state_probabilities_over_time(posteriors: PosteriorCache,
                                        timestamps_list: List[np.ndarray],
                                        out_dir: str, bin_width_hours: float = 0.5,
                                        highlight_hour: Optional[float] = 3.0):
@@ -393,10 +685,8 @@ def plot_state_probabilities_over_time(model: 'HMM', all_choices: List[np.ndarra
     
     Parameters:
     -----------
-    model : HMM
-        Fitted GLM-HMM model
-    all_choices, all_inputs : lists of arrays
-        Data used for fitting
+    posteriors : PosteriorCache
+        Posterior state probabilities of the fitted GLM-HMM
     timestamps_list : list of np.ndarray
         Each element contains timestamps (in minutes from recording start) 
         for the corresponding session's choices
@@ -407,19 +697,14 @@ def plot_state_probabilities_over_time(model: 'HMM', all_choices: List[np.ndarra
     highlight_hour : float, optional
         Hour to highlight with vertical line (e.g., 3.0 for hypothesis test)
     """
-    
-    # Compute posterior state probabilities for each session
-    posteriors = []
-    for ch, inp in zip(all_choices, all_inputs):
-        post = model.expected_states(data=ch, input=inp)[0]  # shape (T, num_states)
-        posteriors.append(post)
+    num_states = posteriors.num_states
     
     # Align all sessions to common time axis (hours since start)
     all_times = np.concatenate([ts / 60 for ts in timestamps_list])  # convert to hours
-    all_posts = np.concatenate(posteriors)
+    all_posts = np.concatenate(list(posteriors))
     
     time_bins = np.arange(0, 12 + bin_width_hours, bin_width_hours)
-    avg_posts = np.zeros((len(time_bins) - 1, model.K))
+    avg_posts = np.zeros((len(time_bins) - 1, num_states))
     
     for i in range(len(time_bins) - 1):
         mask = (all_times >= time_bins[i]) & (all_times < time_bins[i + 1])
@@ -430,8 +715,8 @@ def plot_state_probabilities_over_time(model: 'HMM', all_choices: List[np.ndarra
     
     # Plot
     plt.figure(figsize=(12, 6))
-    colors = plt.cm.tab10(np.linspace(0, 1, model.K))
-    for k in range(model.K):
+    colors = plt.cm.tab10(np.linspace(0, 1, num_states))
+    for k in range(num_states):
         plt.plot(time_centers, avg_posts[:, k], label=f'State {k+1}', 
                 color=colors[k], linewidth=2.5, marker='o', markersize=4)
     
@@ -451,7 +736,7 @@ def plot_state_probabilities_over_time(model: 'HMM', all_choices: List[np.ndarra
     plt.close()
     
     # Save state occupancy data
-    occupancy_df = pd.DataFrame(avg_posts, columns=[f'State_{k+1}' for k in range(model.K)])
+    occupancy_df = pd.DataFrame(avg_posts, columns=[f'State_{k+1}' for k in range(num_states)])
     occupancy_df['time_hours'] = time_centers
     occupancy_df.to_csv(os.path.join(out_dir, 'state_occupancy_by_hour.csv'), index=False)
     
@@ -569,11 +854,57 @@ def plot_state_weights(model: 'HMM', num_segment_types: int, max_lag: int,
     print(f"🎨 Weight visualization saved: state_weight_heatmaps.png")
 
 
+def permutation_mean_differences(posteriors: List[np.ndarray], early_masks: List[np.ndarray],
+                                 n_perm: int = 10000, block_size: int = 1000,
+                                 rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Null distribution of (late - early) mean state probabilities under within-session shuffling.
+    
+    Permuting a session's posteriors against fixed early/late positions is equivalent to
+    permuting its early mask against fixed posteriors, so each block of permutations is a
+    (block, T) 0/1 matrix and the early sums reduce to one matrix product per session.
+    
+    Parameters:
+    -----------
+    posteriors : list of np.ndarray
+        Each element has shape (T_session, num_states)
+    early_masks : list of np.ndarray
+        Boolean arrays of shape (T_session,), True for entries before the split
+    n_perm : int, default=10000
+        Number of permutations
+    block_size : int, default=1000
+        Permutations drawn per batch (bounds memory to block_size * T_session)
+    rng : np.random.Generator, optional
+        Source of randomness; a fresh default_rng() is used if None
+        
+    Returns:
+    --------
+    perm_diffs : np.ndarray, shape (n_perm, num_states)
+        Late-minus-early mean posterior for every permutation
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    num_states = posteriors[0].shape[1]
+    n_early = sum(int(m.sum()) for m in early_masks)
+    n_late = sum(len(m) for m in early_masks) - n_early
+    totals = sum(p.sum(axis=0) for p in posteriors)
+    
+    perm_diffs = np.empty((n_perm, num_states))
+    for b0 in range(0, n_perm, block_size):
+        b = min(block_size, n_perm - b0)
+        early_sum = np.zeros((b, num_states))
+        for p, m in zip(posteriors, early_masks):
+            perm_masks = rng.permuted(np.tile(m.astype(p.dtype), (b, 1)), axis=1)
+            early_sum += perm_masks @ p
+        perm_diffs[b0:b0 + b] = (totals - early_sum) / n_late - early_sum / n_early
+    return perm_diffs
+
+
 def test_strategy_shift_significance(posteriors: List[np.ndarray], 
                                     timestamps_list: List[np.ndarray],
                                     split_hour: float = 3.0, 
-                                    n_perm: int = 1000,
-                                    random_state: int = 42) -> Tuple[float, float]:
+                                    n_perm: int = 10000,
+                                    random_state: int = 42,
+                                    block_size: int = 1000) -> Tuple[float, float]:
     """
     Permutation test for significance of strategy shift at specified hour.
     
@@ -587,30 +918,25 @@ def test_strategy_shift_significance(posteriors: List[np.ndarray],
     p_value : float
         Empirical p-value from permutation test
     """
-    np.random.seed(random_state)
+    rng = np.random.default_rng(random_state)
+    
+    # Early/late split depends only on timestamps, so compute masks once
+    early_masks = [ts / 60 < split_hour for ts in timestamps_list]
     
     # Compute observed difference
-    early_posts = np.concatenate([p[ts/60 < split_hour] for p, ts in zip(posteriors, timestamps_list)])
-    late_posts = np.concatenate([p[ts/60 >= split_hour] for p, ts in zip(posteriors, timestamps_list)])
+    early_posts = np.concatenate([p[m] for p, m in zip(posteriors, early_masks)])
+    late_posts = np.concatenate([p[~m] for p, m in zip(posteriors, early_masks)])
     obs_diff = late_posts.mean(axis=0) - early_posts.mean(axis=0)
     obs_stat = np.max(np.abs(obs_diff))  # max absolute change across states
     
     # Permutation test: shuffle trial order within each session
-    perm_stats = []
-    for _ in range(n_perm):
-        perm_posts = []
-        for p, ts in zip(posteriors, timestamps_list):
-            idx = np.random.permutation(len(p))
-            perm_posts.append(p[idx])
-        perm_early = np.concatenate([pp[ts/60 < split_hour] for pp, ts in zip(perm_posts, timestamps_list)])
-        perm_late = np.concatenate([pp[ts/60 >= split_hour] for pp, ts in zip(perm_posts, timestamps_list)])
-        perm_diff = perm_late.mean(axis=0) - perm_early.mean(axis=0)
-        perm_stats.append(np.max(np.abs(perm_diff)))
-    
-    p_value = np.mean(np.array(perm_stats) >= obs_stat)
+    perm_diffs = permutation_mean_differences(posteriors, early_masks, n_perm, block_size, rng)
+    perm_stats = np.max(np.abs(perm_diffs), axis=1)
+    
+    p_value = np.mean(perm_stats >= obs_stat)
     return obs_stat, p_value
 
-def assess_model_reliability(model, all_choices, all_inputs, 
+def assess_model_reliability(model, posteriors, 
                            timestamps_list, out_dir, 
                            max_lag=5, num_seg_types=8):
     """Quick diagnostic summary."""
@@ -629,13 +955,12 @@ def assess_model_reliability(model, all_choices, all_inputs,
     print(f"✅ Weight dispersion (std): {weight_std:.3f} {'(regularized)' if weight_std < 3 else '(may be overfit)'}")
     
     # 4. Posterior state clarity
-    posteriors = [model.expected_states(data=ch, input=inp)[0] for ch, inp in zip(all_choices, all_inputs)]
     avg_max_post = np.mean([np.max(p, axis=1).mean() for p in posteriors])
     print(f"✅ Posterior confidence (avg max prob): {avg_max_post:.3f} {'(clear)' if avg_max_post > 0.7 else '(uncertain)'}")
     
     # 5. Temporal structure (quick visual)
     time_centers, avg_posts = plot_state_probabilities_over_time(
-        model, all_choices, all_inputs, timestamps_list, out_dir, highlight_hour=3.0)
+        posteriors, timestamps_list, out_dir, highlight_hour=3.0)
     
     print("\n📊 Next steps:")
     print("   • Inspect state_weight_heatmaps.png for interpretable patterns")
@@ -644,7 +969,7 @@ def assess_model_reliability(model, all_choices, all_inputs,
     print("="*60 + "\n")
 
 # =============================================================================
-# 11. MAIN PIPELINE WITH GLM-HMM INTEGRATION
+# 12. MAIN PIPELINE WITH GLM-HMM INTEGRATION
 # =============================================================================
 
 def main():
@@ -667,6 +992,8 @@ def main():
     prior_sigma = 2.0             # Gaussian prior std for MAP estimation (None for MLE)
     prior_alpha = 2.0             # Dirichlet prior concentration for transitions
     glmhmm_iters = 200            # EM iterations for GLM-HMM
+    warm_start = True             # Seed CV folds from the full fit and K+1 from a split of K
+    n_perm = 10000                # Permutations for the strategy shift test
     
     # Analysis parameters
     min_start, min_end = 0, 721   # Minutes to include in analysis
@@ -675,19 +1002,20 @@ def main():
     
     # ==================== STEP 1: LOAD & SEGMENT ====================
     print("📥 Loading sessions & remapping roles...")
-    dom_s, sub_s, fids, idx_name, vocab_map, fps, other_id = load_dual_role_full_10hz(h5_dir)
-    print(f"   ✅ {len(dom_s)} sessions | {len(vocab_map)} behaviors | {fps}Hz")
+    sessions, idx_name, vocab_map, fps, other_id = load_dual_role_full_10hz(h5_dir)
+    print(f"   ✅ {len(sessions)} sessions | {len(vocab_map)} behaviors | {fps}Hz")
     
     neutral_ids = [other_id]
     vocab_size = len(vocab_map)
     
     print("⏱️ Computing segment proportion vectors...")
-    X, meta = compute_segment_vectors(dom_s, sub_s, fids, neutral_ids, fps, vocab_size)
+    X, meta = compute_segment_vectors(sessions, neutral_ids, fps, vocab_size)
     print(f"   ✅ {len(X)} active segments extracted")
     
     print("🔍 Optimizing clusters (silhouette score)...")
-    cluster_labels, best_k, silhouette_scores = optimize_and_cluster(X, k_range=k_range, silhouette_sample=silhouette_sample)
+    cluster_labels, best_k, silhouette_scores, sweep_df = optimize_and_cluster(X, k_range=k_range, silhouette_sample=silhouette_sample)
     meta['cluster'] = cluster_labels
+    sweep_df.to_csv(os.path.join(out_dir, 'cluster_k_sweep.csv'), index=False)
     
 
     # ==================== STEP 3: PREPARE DATA FOR GLM-HMM ====================
@@ -697,31 +1025,21 @@ def main():
     # We need: for each entry, which chamber was chosen (binary) and what segment type occurred
     segment_labels_list, choice_list, timestamps_list = [], [], []
     
-    # Load session metadata for timestamps
-    session_meta = {}
-    for f in sorted(glob.glob(os.path.join(h5_dir, "*.h5"))):
-        with h5py.File(f, 'r') as hf:
-            attrs = dict(hf['/meta'].attrs)
-            sid = os.path.basename(f)
-            session_meta[sid] = {
-                'day': int(attrs.get('day', 0)),
-                'se': attrs.get('se_status', False),
-                'fps': float(attrs.get('fps', fps))
-            }
+    # Session metadata was recorded by the loader while streaming
+    session_meta = sessions.metadata
     
     # Process each session
-    for dom_seq, sub_seq, fid in zip(dom_s, sub_s, fids):
+    for fid in pd.unique(meta['session_id']):
+        info = session_meta.loc[fid]
         # Apply same filters as in cluster analysis
-        if filter_dates is not None:
-            day = session_meta.get(fid, {}).get('day')
-            if day not in filter_dates:
-                continue
-        if filter_se == "SE" and not session_meta.get(fid, {}).get('se'):
+        if filter_dates is not None and info['day'] not in filter_dates:
             continue
-        elif filter_se == "VG" and session_meta.get(fid, {}).get('se'):
+        if filter_se == "SE" and not info['se_status']:
+            continue
+        elif filter_se == "VG" and info['se_status']:
             continue
 
-        fps = session_meta[fid]['fps']
+        fps = info['fps']
         
         # Get segments for this session from meta
         session_meta_df = meta[meta['session_id'] == fid]
@@ -770,15 +1088,29 @@ def main():
     # ==================== STEP 4: SELECT NUMBER OF STATES VIA CROSS-VALIDATION ====================
     print("\n🔍 Selecting optimal number of GLM-HMM states via cross-validation...")
     
-    cv_results = {}
-    for K in num_states_range:
-        mean_ll, std_ll = cross_validate_glmhmm(
+    # With warm_start, both the full-data chain and every CV fold are seeded from a split of
+    # their own (K-1)-state solution; folds only ever see their training sessions.
+    cv_results, full_fits, fold_fits = {}, {}, {}
+    for K in sorted(num_states_range):
+        fold_init, full_iters = None, np.nan
+        if warm_start:
+            seed = split_glmhmm_state(full_fits[K - 1][0].params) if K - 1 in full_fits else None
+            full_fits[K] = fit_glmhmm(
+                all_choices, all_inputs, K, input_dim,
+                prior_sigma=prior_sigma, prior_alpha=prior_alpha,
+                num_iters=glmhmm_iters, random_state=42, init_params=seed
+            )
+            full_iters = len(full_fits[K][1]) - 1
+            if K - 1 in fold_fits:
+                fold_init = [split_glmhmm_state(p) if p is not None else None for p in fold_fits[K - 1]]
+        mean_ll, std_ll, cv_iters, fold_fits[K] = cross_validate_glmhmm(
             all_choices, all_inputs, K, input_dim,
             prior_sigma=prior_sigma, prior_alpha=prior_alpha,
-            num_folds=min(5, len(all_inputs)), random_state=42
+            num_folds=min(5, len(all_inputs)), random_state=42,
+            num_iters=glmhmm_iters, fold_init_params=fold_init
         )
-        cv_results[K] = (mean_ll, std_ll)
-        print(f"  K={K}: CV Log-Likelihood = {mean_ll:.2f} ± {std_ll:.2f}")
+        cv_results[K] = (mean_ll, std_ll, full_iters, cv_iters, 'fold K-1 split' if fold_init else 'random')
+        print(f"  K={K}: CV Log-Likelihood = {mean_ll:.2f} ± {std_ll:.2f} | EM iters: full={full_iters}, CV mean={cv_iters:.1f}")
     
     # Select best K
     best_glmhmm_K = max(cv_results, key=lambda k: cv_results[k][0])
@@ -786,24 +1118,33 @@ def main():
     
     # Save CV results
     cv_df = pd.DataFrame([
-        {'num_states': K, 'mean_test_ll': ll[0], 'std_test_ll': ll[1]}
-        for K, ll in cv_results.items()
+        {'num_states': K, 'mean_test_ll': r[0], 'std_test_ll': r[1],
+         'full_fit_em_iters': r[2], 'cv_mean_em_iters': r[3], 'cv_fold_init': r[4]}
+        for K, r in cv_results.items()
     ])
     cv_df.to_csv(os.path.join(out_dir, 'glmhmm_cross_validation.csv'), index=False)
     
     # ==================== STEP 5: FIT FINAL GLM-HMM ====================
-    print(f"\n🧠 Fitting final GLM-HMM with K={best_glmhmm_K} states...")
+    if best_glmhmm_K in full_fits:
+        print(f"\n🧠 Reusing full-data GLM-HMM fit with K={best_glmhmm_K} states from the sweep...")
+        model, ll_trace = full_fits[best_glmhmm_K]
+    else:
+        print(f"\n🧠 Fitting final GLM-HMM with K={best_glmhmm_K} states...")
+        model, ll_trace = fit_glmhmm(
+            all_choices, all_inputs, best_glmhmm_K, input_dim,
+            prior_sigma=prior_sigma, prior_alpha=prior_alpha,
+            num_iters=glmhmm_iters, random_state=42
+        )
     
-    model, ll_trace = fit_glmhmm(
-        all_choices, all_inputs, best_glmhmm_K, input_dim,
-        prior_sigma=prior_sigma, prior_alpha=prior_alpha,
-        num_iters=glmhmm_iters, random_state=42
+    # Save model parameters
+    save_glmhmm(
+        model, os.path.join(out_dir, 'glmhmm_model'),
+        config={'max_lag': max_lag, 'num_segment_types': int(num_segment_types),
+                'k_range': list(k_range), 'min_start': min_start, 'min_end': min_end,
+                'filter_dates': filter_dates, 'filter_se': filter_se},
+        prior_sigma=prior_sigma, prior_alpha=prior_alpha
     )
-    
-    # Save model
-    with open(os.path.join(out_dir, 'glmhmm_model.pkl'), 'wb') as f:
-        pickle.dump(model, f)
-    print(f"💾 Model saved to glmhmm_model.pkl")
+    print(f"💾 Model saved to glmhmm_model.npz / glmhmm_model.json")
     
     # Plot convergence
     plt.figure(figsize=(8, 5))
@@ -816,24 +1157,27 @@ def main():
     plt.savefig(os.path.join(out_dir, 'glmhmm_convergence.png'), dpi=300, bbox_inches='tight')
     plt.close()
     
-    assess_model_reliability(model, all_choices, all_inputs, timestamps_list, out_dir, max_lag, num_segment_types)
+    # Forward-backward once; every diagnostic below reads from this cache
+    posteriors = PosteriorCache.from_model(
+        model, all_choices, all_inputs, n_jobs=-1,
+        cache_path=os.path.join(out_dir, 'glmhmm_posteriors.npz')
+    )
+    
+    assess_model_reliability(model, posteriors, timestamps_list, out_dir, max_lag, num_segment_types)
 
     # ==================== STEP 6: VISUALIZE STRATEGY SHIFT ====================
     print("\n📈 Visualizing strategy shift over time...")
     
-    # Compute posteriors for permutation test
-    posteriors = [model.expected_states(data=ch, input=inp)[0] for ch, inp in zip(all_choices, all_inputs)]
-    
     # Plot state probabilities over time
     time_centers, avg_posts = plot_state_probabilities_over_time(
-        model, all_choices, all_inputs, timestamps_list, out_dir,
+        posteriors, timestamps_list, out_dir,
         bin_width_hours=0.5, highlight_hour=3.0
     )
     
     # Test significance of 3-hour shift
     print(f"🧪 Testing significance of strategy shift at 3 hours...")
     obs_stat, p_value = test_strategy_shift_significance(
-        posteriors, timestamps_list, split_hour=3.0, n_perm=1000, random_state=42
+        posteriors.posteriors, timestamps_list, split_hour=3.0, n_perm=n_perm, random_state=42
     )
     print(f"   Observed shift statistic: {obs_stat:.3f}")
     print(f"   Permutation test p-value: {p_value:.3f}")
@@ -842,7 +1186,7 @@ def main():
     with open(os.path.join(out_dir, 'strategy_shift_test.txt'), 'w') as f:
         f.write(f"Strategy Shift Significance Test (split at 3 hours)\n")
         f.write(f"Observed statistic (max |Δstate prob|): {obs_stat:.4f}\n")
-        f.write(f"Permutation test p-value (n=1000): {p_value:.4f}\n")
+        f.write(f"Permutation test p-value (n={n_perm}): {p_value:.4f}\n")
         f.write(f"Conclusion: {'Significant shift detected' if p_value < 0.05 else ' No significant shift'}\n")
     
     # ==================== STEP 7: VISUALIZE TRANSITIONS & WEIGHTS ====================
@@ -881,7 +1225,8 @@ def main():
     print(f"   • strategy_shift_over_time.png  → Population strategy usage across night")
     print(f"   • transition_matrix.png         → How strategies switch between entries")
     print(f"   • state_weight_heatmaps.png     → What behaviors drive choices in each state")
-    print(f"   • glmhmm_model.pkl              → Fitted model for reuse")
+    print(f"   • glmhmm_model.npz/.json        → Fitted parameters, reload with load_glmhmm()")
+    print(f"   • glmhmm_posteriors.npz         → Cached per-session posterior state probabilities")
     print(f"   • strategy_shift_test.txt       → Statistical test of 3h shift hypothesis")
     print(f"\n🔍 Interpretation guide:")
     print(f"   • If State 1 dominates early (0-3h) with weights favoring subordinate chamber,")
@@ -1,27 +1,23 @@
 import os
-import json
-import glob
-import h5py
+import hashlib
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from hmmlearn.hmm import CategoricalHMM
+from hmmlearn.base import ConvergenceMonitor
 from scipy import stats
 from statsmodels.stats.multitest import multipletests
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 from typing import Dict
+from functools import partial
 
-from asoid_bout_cleaner import refine_bouts_parallel
+from asoid_bout_cleaner import refine_bouts_cohort
+from session_stream import DualRoleSessionStream, read_reference_map
 
 
-def load_dual_role_full_10hz(h5_dir, min_start=None, min_end=None):
+def load_dual_role_full_10hz(h5_dir, min_start=None, min_end=None, max_files=None):
 
-    h5_files = sorted(glob.glob(os.path.join(h5_dir, "*.h5")))
-    if not h5_files: raise ValueError("No .h5 files found.")
-    
-    with h5py.File(h5_files[0], 'r') as f:
-        ref_map = json.loads(f['/meta/behavior_map'][()])
-        fps = f['/meta'].attrs.get('fps', 10.0)
+    h5_files, ref_map, fps = read_reference_map(h5_dir)
         
     # Build role vocabulary
     base_behaviors = sorted(set(name[4:] for name in ref_map if name.startswith(('dom_', 'sub_'))))
@@ -48,46 +44,24 @@ def load_dual_role_full_10hz(h5_dir, min_start=None, min_end=None):
         elif name == 'other':
             dom_remap[orig_idx] = vocab_map.get('transit', -1)
             sub_remap[orig_idx] = vocab_map.get('transit', -1)
-            
-    dom_seqs, sub_seqs, file_ids = [], [], []
-    
-    for f in h5_files:
-        with h5py.File(f, 'r') as hf:
-            arr = hf['/data/behaviors'][:].flatten()
-            fid = hf['/meta'].attrs.get('session_id', os.path.basename(f))
-            
-        total = len(arr)
-        s = int((min_start or 0) * 60 * fps)
-        e = int((min_end or total / 60 / fps) * 60 * fps)
-        arr = arr[max(0,s):min(total,e)]
-
-        dom_arr = dom_remap[arr].astype(int)
-        sub_arr = sub_remap[arr].astype(int)
-
-        other_id = vocab_map['transit']
-        dom_arr = split_other_by_duration(
-            dom_arr, other_id, 
-            min_long_frames=3000,  # 5 min @ 10Hz
-            long_label_name="avoidance",
-            vocab_map=vocab_map,
-            idx_to_name=idx_to_name
-        )
-        sub_arr = split_other_by_duration(
-            sub_arr, other_id,
-            min_long_frames=3000,
-            long_label_name="avoidance",
-            vocab_map=vocab_map,
-            idx_to_name=idx_to_name
-        )
-
-        dom_seqs.append(dom_arr)
-        sub_seqs.append(sub_arr)
-        file_ids.append(fid)
-
-        if len(file_ids) >= 99:
-            break 
-        
-    return dom_seqs, sub_seqs, file_ids, idx_to_name, vocab_map, fps 
+
+    other_id = vocab_map['transit']
+    split_long_other = partial(
+        split_other_by_duration,
+        other_id=other_id,
+        min_long_frames=3000,  # 5 min @ 10Hz
+        long_label_name="avoidance",
+        vocab_map=vocab_map,
+        idx_to_name=idx_to_name
+    )
+
+    sessions = DualRoleSessionStream(
+        h5_files, dom_remap, sub_remap, fps, len(vocab),
+        min_start, min_end, max_files,
+        id_from_attrs=True,
+        transform=split_long_other
+    )
+    return sessions, idx_to_name, vocab_map, fps 
 
 def split_other_by_duration(
     seq: np.ndarray, 
@@ -100,7 +74,7 @@ def split_other_by_duration(
 
     is_other = (seq == other_id)
     if not np.any(is_other):
-        return seq, vocab_map, idx_to_name
+        return seq
         
     new_seq = seq.copy()
     
@@ -123,20 +97,41 @@ def split_other_by_duration(
 # 2. MEDIAN FILTER + BOUT EXTRACTION
 # =============================================================================
 
+def _session_batches(sessions, batch_size):
+    batch = []
+    for session in sessions:
+        batch.append(session)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 def process_tracks_to_bouts(
-    dom_seqs, sub_seqs, file_ids, 
+    sessions,
     neutral_ids,
     eps_frames=25,
     min_cluster_size=3,
-    n_jobs=-1
+    n_jobs=-1,
+    session_batch_size=16
 ):
-    
+    """
+    Refine and bout-encode every track, consuming the session stream in batches of
+    session_batch_size sessions. Each batch is refined in one worker pool and reduced to its
+    bout table before the next batch is read, so at most one batch of frame-level sequences
+    is in memory.
+    Returns: bout sequences, bout metadata DataFrame
+    """
     all_bout_seqs, all_bout_meta = [], []
-    
-    def process_track(seqs, track_label):
-        for seq, fid in zip(seqs, file_ids):
-            refined = refine_bouts_parallel(seq, neutral_ids, eps_frames, min_cluster_size, n_jobs)
-            
+    for batch in _session_batches(sessions, session_batch_size):
+        track_seqs, track_keys = [], []
+        for fid, dom_seq, sub_seq in batch:
+            track_seqs.extend([dom_seq, sub_seq])
+            track_keys.extend([(fid, 'dom'), (fid, 'sub')])
+        refined_seqs = refine_bouts_cohort(track_seqs, neutral_ids, eps_frames, min_cluster_size, n_jobs)
+        del track_seqs
+        
+        for (fid, track_label), refined in zip(track_keys, refined_seqs):
             ids, lengths, starts = extract_sustained_bouts_simple(refined, min_bout_frames=10)
             if len(ids) < 2: continue
             
@@ -145,9 +140,6 @@ def process_tracks_to_bouts(
                 'session_id': fid, 'track': track_label,
                 'bout_ids': ids, 'bout_lengths': lengths, 'bout_starts': starts
             })
-            
-    process_track(dom_seqs, 'dom')
-    process_track(sub_seqs, 'sub')
     return all_bout_seqs, pd.DataFrame(all_bout_meta)
 
 def extract_sustained_bouts_simple(labels, min_bout_frames=5):
@@ -187,7 +179,78 @@ def extract_sustained_bouts_simple(labels, min_bout_frames=5):
 # =============================================================================
 # 3. CATEGORICAL HMM TRAINING
 # =============================================================================
-def train_bout_cat_hmm(sequences, state_range=range(4, 9), max_iter=300, tol=1e-2, random_state=42):
+def _new_cat_hmm(n, n_features, tol, seed):
+    return CategoricalHMM(
+        n_components=n,
+        n_features=n_features,
+        tol=tol,
+        init_params='ste',
+        params='ste',
+        random_state=seed,
+        verbose=False
+    )
+
+def _fit_cat_hmm_stage(model, X_concat, lengths, n_iter, final):
+    """
+    Run up to n_iter more EM iterations (continuing from the current parameters after the first call).
+    Returns (model, log-likelihood, status, bic) with status 'converged' (tolerance reached),
+    'max_iter' (final stage stopped by the iteration cap) or 'running'; bic is only computed
+    once the fit is done.
+    """
+    try:
+        # the monitor built in __init__ keeps the constructor's n_iter, so give each stage its own
+        model.n_iter = n_iter
+        model.monitor_ = ConvergenceMonitor(model.tol, n_iter, False)
+        model.fit(X_concat, lengths=lengths)
+        model.init_params = ''
+        # monitor_.converged is also True when the cap is hit, so test the tolerance directly
+        hist = model.monitor_.history
+        if len(hist) >= 2 and hist[-1] - hist[-2] < model.tol:
+            status = 'converged'
+        else:
+            status = 'max_iter' if final else 'running'
+        bic = model.bic(X_concat, lengths=lengths) if status != 'running' else np.nan
+        return model, hist[-1], status, bic
+    except Exception as e:
+        print(f"\nFailed for n_states={model.n_components}: {type(e).__name__}: {e}")
+        return None, -np.inf, 'failed', np.inf
+
+def _sweep_cache_path(cache_dir, n, seed):
+    return os.path.join(cache_dir, f"cathmm_n{n}_seed{seed}.npz")
+
+def _save_sweep_result(cache_dir, n, seed, res):
+    model = res['model']
+    np.savez(
+        _sweep_cache_path(cache_dir, n, seed),
+        bic=res['bic'], ll=res['ll'], status=res['status'],
+        startprob=model.startprob_, transmat=model.transmat_, emissionprob=model.emissionprob_
+    )
+
+def _load_sweep_result(cache_dir, n, seed, n_features, tol):
+    path = _sweep_cache_path(cache_dir, n, seed)
+    if not os.path.isfile(path):
+        return None
+    with np.load(path) as data:
+        model = _new_cat_hmm(n, n_features, tol, seed)
+        model.init_params = ''
+        model.startprob_ = data['startprob']
+        model.transmat_ = data['transmat']
+        model.emissionprob_ = data['emissionprob']
+        return {'bic': float(data['bic']), 'll': float(data['ll']), 'status': str(data['status']), 'model': model}
+
+def train_bout_cat_hmm(sequences, state_range=range(4, 9), max_iter=300, tol=1e-2, random_state=42,
+                       n_restarts=5, warmup_iters=30, prune_rel_gap=0.01, cache_dir=None, n_jobs=-1):
+    """
+    BIC sweep over n_states with several seeded restarts per state count.
+
+    All (n_states, seed) fits share one process pool. Every restart first runs warmup_iters
+    EM iterations; restarts whose log-likelihood is then more than prune_rel_gap (relative)
+    below the best restart of the same n_states are stopped as hopeless, the rest continue
+    up to max_iter. Finished restarts ('converged' or 'max_iter') are cached per
+    (n_states, seed) in cache_dir, keyed by a hash of the data, max_iter, tol, warmup_iters and
+    prune_rel_gap, so extending state_range later reuses them. Cached restarts also set the
+    pruning bar for new restarts of the same n_states. Pruned restarts are never cached.
+    """
     valid_seqs = [np.array(s, dtype=np.int32) for s in sequences if len(s) > 1]
     valid_seqs = [s for s in valid_seqs if len(np.unique(s)) > 1]
     
@@ -201,33 +264,77 @@ def train_bout_cat_hmm(sequences, state_range=range(4, 9), max_iter=300, tol=1e-
     print(f"   Inferred n_features (vocab size): {n_features}")
     print(f"   Total bouts: {len(X_concat)}, Sequences: {len(lengths)}")
     
-    def train_and_score(n):
-        try:
-            model = CategoricalHMM(
-                n_components=n,
-                n_features=n_features,
-                n_iter=max_iter,
-                tol=tol,
-                init_params='ste',
-                params='ste',
-                random_state=random_state,
-                verbose=False
+    if cache_dir is not None:
+        h = hashlib.sha1(X_concat.tobytes() + np.asarray(lengths).tobytes())
+        # "v2": entries written before the per-stage iteration cap was honoured are under-fit
+        h.update(f"v2-{max_iter}-{tol}-{warmup_iters}-{prune_rel_gap}".encode())
+        cache_dir = os.path.join(cache_dir, h.hexdigest()[:12])
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    tasks = [(n, random_state + r) for n in state_range for r in range(n_restarts)]
+    results = {}
+    if cache_dir is not None:
+        for n, seed in tasks:
+            cached = _load_sweep_result(cache_dir, n, seed, n_features, tol)
+            if cached is not None:
+                results[(n, seed)] = cached
+    todo = [t for t in tasks if t not in results]
+    
+    print(f"BIC sweep over n_states = {list(state_range)} x {n_restarts} restarts "
+          f"({len(tasks) - len(todo)} cached, {len(todo)} to fit)...")
+    
+    if todo:
+        with Parallel(n_jobs=n_jobs, verbose=10) as pool:
+            # Stage 1: short warm-up for every restart
+            stage1 = pool(
+                delayed(_fit_cat_hmm_stage)(
+                    _new_cat_hmm(n, n_features, tol, seed), X_concat, lengths,
+                    min(warmup_iters, max_iter), warmup_iters >= max_iter
+                ) for n, seed in todo
             )
-            # Pass concatenated array + lengths
-            model.fit(X_concat, lengths=lengths)
-            bic = model.bic(X_concat, lengths=lengths)
-            return n, bic, model
-        except Exception as e:
-            print(f"\nFailed for n_states={n}: {type(e).__name__}: {e}")
-            return n, np.inf, None
+            best_ll = {}
+            for (n, _), res in results.items():
+                best_ll[n] = max(best_ll.get(n, -np.inf), res['ll'])
+            for (n, _), (_, ll, _, _) in zip(todo, stage1):
+                best_ll[n] = max(best_ll.get(n, -np.inf), ll)
             
-    print(f"BIC sweep over n_states = {list(state_range)}...")
-    results = Parallel(n_jobs=-1, verbose=10)(
-        delayed(train_and_score)(n) for n in state_range
-    )
-    valid_results = [r for r in results if r[2] is not None]
+            survivors = []
+            for (n, seed), (model, ll, status, bic) in zip(todo, stage1):
+                if model is None:
+                    continue
+                if status != 'running':
+                    results[(n, seed)] = {'bic': bic, 'll': ll, 'status': status, 'model': model}
+                elif best_ll[n] - ll > prune_rel_gap * abs(best_ll[n]):
+                    results[(n, seed)] = {'bic': np.inf, 'll': ll, 'status': 'pruned', 'model': model}
+                else:
+                    survivors.append(((n, seed), model))
+            
+            # Stage 2: continue promising restarts to convergence
+            stage2 = pool(
+                delayed(_fit_cat_hmm_stage)(model, X_concat, lengths, max_iter - warmup_iters, True)
+                for _, model in survivors
+            )
+            for (key, _), (model, ll, status, bic) in zip(survivors, stage2):
+                if model is not None:
+                    results[key] = {'bic': bic, 'll': ll, 'status': status, 'model': model}
+        
+        if cache_dir is not None:
+            for (n, seed), res in results.items():
+                if (n, seed) in todo and res['status'] != 'pruned':
+                    _save_sweep_result(cache_dir, n, seed, res)
+    
+    valid_results = [(n, res['bic'], res['model']) for (n, _), res in results.items() if np.isfinite(res['bic'])]
     if not valid_results: 
         raise RuntimeError("All HMM training failed.")
+    
+    n_pruned = sum(res['status'] == 'pruned' for res in results.values())
+    n_capped = sum(res['status'] == 'max_iter' for res in results.values())
+    print(f"   {len(valid_results)} restarts finished ({n_capped} stopped at max_iter without converging), "
+          f"{n_pruned} pruned early")
+    for n in state_range:
+        bics = [b for m, b, _ in valid_results if m == n]
+        if bics:
+            print(f"   n_states={n:2d} | best BIC = {min(bics):.1f} over {len(bics)} restarts")
         
     best_n, best_bic, best_model = min(valid_results, key=lambda x: x[1])
     print(f"Optimal n_states = {best_n} (BIC = {best_bic:.1f})")
@@ -252,15 +359,104 @@ def interpret_bout_motifs(model, idx_to_name, top_n=3):
 # =============================================================================
 # 4. DECODE & EXPAND TO FRAME LEVEL
 # =============================================================================
-def decode_and_expand_frames(model, bout_meta, idx_to_name, out_dir, fps):
-    """Predict motifs per bout, expand to original frames, save CSVs."""
-    # 1. Predict motifs for each bout sequence
-    predicted_motifs = []
-    for _, row in bout_meta.iterrows():
-        bout_seq = np.array(row['bout_ids'], dtype=int)
-        # CategoricalHMM expects (n_samples, 1)
-        states = model.predict(bout_seq.reshape(-1, 1))
-        predicted_motifs.append(states)
+def _default_table_format():
+    """'parquet' when a parquet engine is importable, otherwise 'csv'."""
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return 'parquet'
+        except ImportError:
+            pass
+    return 'csv'
+
+def _write_table(df, out_base, out_format):
+    """Write df as parquet/hdf5/csv; returns the path written (CSV if the optional writer is missing)."""
+    if out_format == 'parquet':
+        try:
+            df.to_parquet(f"{out_base}.parquet", index=False)
+            return f"{out_base}.parquet"
+        except ImportError:
+            print(f"pyarrow/fastparquet not installed, writing {out_base}.csv instead")
+    elif out_format == 'hdf5':
+        try:
+            df.to_hdf(f"{out_base}.h5", key='decoded', mode='w', format='table')
+            return f"{out_base}.h5"
+        except ImportError:
+            print(f"PyTables not installed, writing {out_base}.csv instead")
+    elif out_format != 'csv':
+        raise ValueError(f"Unknown out_format: {out_format}. Use 'parquet', 'hdf5', or 'csv'.")
+    df.to_csv(f"{out_base}.csv", index=False)
+    return f"{out_base}.csv"
+
+def _expand_track(track_data, track, idx_to_name, fps):
+    """Columnar bout table and frame table for one track (np.repeat over bout lengths)."""
+    motif_ids = np.concatenate([np.asarray(m, dtype=np.int32) for m in track_data['motif_id']])
+    lengths = np.concatenate([np.asarray(l, dtype=np.int64) for l in track_data['bout_lengths']])
+    starts = np.concatenate([np.asarray(s, dtype=np.int64) for s in track_data['bout_starts']])
+    n_bouts = np.array([len(m) for m in track_data['motif_id']])
+    
+    session_names, session_codes = np.unique(track_data['session_id'].values, return_inverse=True)
+    bout_session = np.repeat(session_codes, n_bouts)
+    bout_idx = np.arange(len(motif_ids)) - np.repeat(np.cumsum(n_bouts) - n_bouts, n_bouts)
+    
+    used_motifs, motif_codes = np.unique(motif_ids, return_inverse=True)
+    motif_labels = [f"M{m}_{idx_to_name.get(m, 'unknown')}" for m in used_motifs]
+    
+    bouts = pd.DataFrame({
+        'session_id': pd.Categorical.from_codes(bout_session, session_names),
+        'track': track,
+        'bout_idx': bout_idx.astype(np.int32),
+        'start_frame': starts,
+        'n_frames': lengths,
+        'motif_id': motif_ids,
+        'motif_label': pd.Categorical.from_codes(motif_codes, motif_labels)
+    })
+    
+    bout_of_frame = np.repeat(np.arange(len(motif_ids)), lengths)
+    frame = starts[bout_of_frame] + (np.arange(len(bout_of_frame)) - (np.cumsum(lengths) - lengths)[bout_of_frame])
+    frames = pd.DataFrame({
+        'session_id': pd.Categorical.from_codes(bout_session[bout_of_frame], session_names),
+        'track': pd.Categorical.from_codes(np.zeros(len(frame), dtype=np.int8), [track]),
+        'frame': frame,
+        'time_sec': frame / fps,
+        'bout_idx': bouts['bout_idx'].values[bout_of_frame],
+        'motif_id': motif_ids[bout_of_frame],
+        'motif_label': pd.Categorical.from_codes(motif_codes[bout_of_frame], motif_labels)
+    })
+    return frames, bouts
+
+def _predict_concat(model, seqs):
+    lengths = [len(s) for s in seqs]
+    states = model.predict(np.concatenate(seqs).reshape(-1, 1), lengths=lengths)
+    return np.split(states, np.cumsum(lengths)[:-1])
+
+def predict_bout_motifs(model, bout_seqs, n_jobs=1, n_chunks=None):
+    """
+    Viterbi-decode all bout sequences in one call using hmmlearn's `lengths`.
+    With n_jobs != 1 the sequences are split into n_chunks contiguous groups decoded in parallel.
+    """
+    seqs = [np.asarray(s, dtype=np.int32) for s in bout_seqs]
+    if not seqs:
+        return []
+    if n_jobs == 1:
+        return _predict_concat(model, seqs)
+    
+    n_chunks = min(len(seqs), n_chunks or 4 * effective_n_jobs(n_jobs))
+    bounds = np.linspace(0, len(seqs), n_chunks + 1, dtype=int)
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(_predict_concat)(model, seqs[a:b]) for a, b in zip(bounds[:-1], bounds[1:]) if a < b
+    )
+    return [states for chunk in chunks for states in chunk]
+
+def decode_and_expand_frames(model, bout_meta, idx_to_name, out_dir, fps, out_format=None, save_bouts=True, n_jobs=1):
+    """
+    Predict motifs per bout, expand to original frames, save per-track tables (parquet/hdf5/csv).
+    out_format defaults to parquet when pyarrow/fastparquet is installed, else CSV.
+    """
+    if out_format is None:
+        out_format = _default_table_format()
+    # 1. Predict motifs for all bout sequences at once
+    predicted_motifs = predict_bout_motifs(model, bout_meta['bout_ids'].tolist(), n_jobs=n_jobs)
         
     # Safely assign array column
     bout_meta = bout_meta.copy()
@@ -270,29 +466,16 @@ def decode_and_expand_frames(model, bout_meta, idx_to_name, out_dir, fps):
     frame_dfs = {'dom': [], 'sub': []}
     for track in ['dom', 'sub']:
         track_data = bout_meta[bout_meta['track'] == track]
-        records = []
-        for _, row in track_data.iterrows():
-            fid = row['session_id']
-            motif_ids = row['motif_id']
-            lengths = row['bout_lengths']
-            starts = row['bout_starts']
-            
-            for b_idx in range(len(motif_ids)):
-                m_id = int(motif_ids[b_idx])
-                m_label = f"M{m_id}_{idx_to_name.get(m_id, 'unknown')}"
-                length = int(lengths[b_idx])
-                start_f = int(starts[b_idx])
-                
-                for f in range(start_f, start_f + length):
-                    records.append({
-                        'session_id': fid, 'track': track,
-                        'frame': f, 'time_sec': f / fps,
-                        'bout_idx': b_idx, 'motif_id': m_id, 'motif_label': m_label
-                    })
-        df = pd.DataFrame(records)
-        out_path = os.path.join(out_dir, f"decoded_{track}_frames.csv")
-        df.to_csv(out_path, index=False)
+        if len(track_data) == 0:
+            frame_dfs[track] = pd.DataFrame(columns=['session_id', 'track', 'frame', 'time_sec',
+                                                     'bout_idx', 'motif_id', 'motif_label'])
+            continue
+        df, bouts = _expand_track(track_data, track, idx_to_name, fps)
+        out_path = _write_table(df, os.path.join(out_dir, f"decoded_{track}_frames"), out_format)
         print(f"Saved {out_path} ({len(df)} frames)")
+        if save_bouts:
+            bout_path = _write_table(bouts, os.path.join(out_dir, f"decoded_{track}_bouts"), out_format)
+            print(f"Saved {bout_path} ({len(bouts)} bouts)")
         frame_dfs[track] = df
         
     return frame_dfs
@@ -307,7 +490,7 @@ def compare_tracks_frame_level(track_dfs, out_dir, alpha=0.05):
     
     stats_list = []
     for track, df in track_dfs.items():
-        props = df.groupby(['session_id', 'motif_label']).size().unstack(fill_value=0)
+        props = df.groupby(['session_id', 'motif_label'], observed=True).size().unstack(fill_value=0)
         props = props.div(props.sum(axis=1), axis=0)
         props = props.reset_index().melt(id_vars='session_id', var_name='motif', value_name='prop')
         props['track'] = track
@@ -355,14 +538,15 @@ def run_bout_cat_hmm(h5_dir, out_dir, state_range=range(4,9)):
     os.makedirs(out_dir, exist_ok=True)
     
     print("Loading full 10Hz sessions with role remapping...")
-    dom_s, sub_s, fids, idx_name, vocab_map, fps = load_dual_role_full_10hz(h5_dir)
-    print(f"   {len(dom_s)} sessions | {len(idx_name)} role-behaviors | {fps}Hz")
+    sessions, idx_name, vocab_map, fps = load_dual_role_full_10hz(h5_dir)
+    print(f"   {len(sessions)} sessions | {len(idx_name)} role-behaviors | {fps}Hz")
 
-    bout_seqs, bout_meta = process_tracks_to_bouts(dom_s, sub_s, fids, neutral_ids=[vocab_map['transit'], vocab_map['avoidance']])
+    bout_seqs, bout_meta = process_tracks_to_bouts(sessions, neutral_ids=[vocab_map['transit'], vocab_map['avoidance']])
     print(f"   {len(bout_seqs)} bout sequences prepared for HMM")
     
     print("Training Bout-based Categorical HMM...")
-    model = train_bout_cat_hmm(bout_seqs, state_range=state_range)
+    model = train_bout_cat_hmm(bout_seqs, state_range=state_range,
+                               cache_dir=os.path.join(out_dir, "hmm_sweep_cache"))
     labels = interpret_bout_motifs(model, idx_name)
     
     print("Decoding motifs & expanding to frames...")
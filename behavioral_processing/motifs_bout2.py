@@ -1,17 +1,23 @@
 import os
 import json
 import glob
-import h5py
+import hashlib
+import joblib
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from typing import List, Tuple, Optional, Iterable
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score
 from sklearn.preprocessing import StandardScaler
 from scipy import stats
+from joblib import Parallel, delayed
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
 from statsmodels.stats.multitest import multipletests
 
+from session_stream import DualRoleSessionStream, read_reference_map
+
 # =============================================================================
 # 1. SEGMENTATION & LOADING
 # =============================================================================
@@ -25,61 +31,59 @@ def array_to_iterable_runs(arr:np.ndarray) -> Iterable[Tuple[int, int, int]]:
     values = arr[starts]
     return zip(starts, ends, values)
 
-def split_by_neutral(seq: np.ndarray, neutral_ids: List[int], min_gap:int=10, max_length: int=3000) -> List[Tuple[int, int]]:
-    """Split sequence into active segments bounded by neutral behaviors."""
-    for start, end, val in array_to_iterable_runs(seq):
-        if val not in neutral_ids:
-            continue
-        if end - start + 1 > min_gap:
-            continue
-        if start > 0:
-            seq[start:end+1] = seq[start-1]
-
-    is_neutral = np.isin(seq, neutral_ids)
-
-    boundaries = np.where(np.diff(is_neutral.astype(int)) != 0)[0] + 1
-    segments = []
-    start = 0
-    for b in boundaries:
-        if is_neutral[start]:
-            start = b
-            continue
-        len_seg = b - start
-        if len_seg <= max_length:
-            segments.append((start, b))
-        else:
-            n_chunks = len_seg // max_length + 1
-            chunk_edges = np.linspace(start, b, n_chunks + 1, dtype=int)
-            for j in range(len(chunk_edges) - 1):
-                st = int(chunk_edges[j])
-                ed = int(chunk_edges[j + 1])
-                if st < ed:
-                    segments.append((st, ed))
-        start = b
-    if start < len(seq) and not is_neutral[start]:
-        len_seg = len(seq) - start
-        if len_seg <= max_length:
-            segments.append((start, len(seq)))
-        else:
-            n_chunks = len_seg // max_length + 1
-            chunk_edges = np.linspace(start, len(seq), n_chunks + 1, dtype=int)
-            for j in range(len(chunk_edges) - 1):
-                st = int(chunk_edges[j])
-                ed = int(chunk_edges[j + 1])
-                if st < ed:
-                    segments.append((st, ed))
-    return segments
+def split_by_neutral(seq: np.ndarray, neutral_ids: List[int], min_gap:int=10, max_length: int=3000) -> np.ndarray:
+    """
+    Split sequence into active segments bounded by neutral behaviors.
+    
+    Neutral runs of at most min_gap frames (not at the sequence start) are filled in
+    place with the preceding behavior; active stretches longer than max_length are
+    cut into equal chunks. Returns an (n_segments, 2) array of [start, end) bounds.
+    """
+    n = len(seq)
+    if n == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    
+    # Run-length encode once
+    change_points = np.flatnonzero(seq[1:] != seq[:-1]) + 1
+    run_starts = np.concatenate(([0], change_points))
+    run_lengths = np.diff(np.append(run_starts, n))
+    run_vals = seq[run_starts]
+    
+    # Fill short neutral gaps: masked forward-fill over runs
+    run_neutral = np.isin(run_vals, neutral_ids)
+    fill = run_neutral & (run_lengths <= min_gap) & (run_starts > 0)
+    if fill.any():
+        src = np.where(fill, 0, np.arange(len(run_vals)))
+        np.maximum.accumulate(src, out=src)
+        run_vals = run_vals[src]
+        run_neutral = run_neutral[src]
+        seq[:] = np.repeat(run_vals, run_lengths)
+    
+    # Active stretches = maximal blocks of non-neutral runs
+    edges = np.diff(np.concatenate(([False], ~run_neutral, [False])).astype(np.int8))
+    bounds = np.append(run_starts, n)
+    act_starts = bounds[np.flatnonzero(edges == 1)]
+    act_ends = bounds[np.flatnonzero(edges == -1)]
+    
+    # Chunk long stretches (same edges as np.linspace(start, end, n_chunks + 1, dtype=int))
+    act_len = act_ends - act_starts
+    n_chunks = np.where(act_len <= max_length, 1, act_len // max_length + 1)
+    seg_owner = np.repeat(np.arange(len(act_starts)), n_chunks)
+    j = np.arange(len(seg_owner)) - np.repeat(np.cumsum(n_chunks) - n_chunks, n_chunks)
+    step = act_len[seg_owner] / n_chunks[seg_owner]
+    seg_starts = (j * step + act_starts[seg_owner]).astype(np.int64)
+    seg_ends = ((j + 1) * step + act_starts[seg_owner]).astype(np.int64)
+    last = j == n_chunks[seg_owner] - 1
+    seg_ends[last] = act_ends[seg_owner[last]]
+    
+    keep = seg_starts < seg_ends
+    return np.column_stack((seg_starts[keep], seg_ends[keep]))
 
 
 def load_dual_role_full_10hz(h5_dir: str, min_start: Optional[float] = None, 
-                            min_end: Optional[float] = None) -> Tuple:
-    """Load sessions and remap to role-agnostic vocabulary."""
-    h5_files = sorted(glob.glob(os.path.join(h5_dir, "*.h5")))
-    if not h5_files: raise ValueError("No .h5 files found.")
-    
-    with h5py.File(h5_files[0], 'r') as f:
-        ref_map = json.loads(f['/meta/behavior_map'][()])
-        fps = float(f['/meta'].attrs.get('fps', 10.0))
+                            min_end: Optional[float] = None, max_files: Optional[int] = None) -> Tuple:
+    """Stream sessions remapped to role-agnostic vocabulary (one file in memory at a time)."""
+    h5_files, ref_map, fps = read_reference_map(h5_dir)
         
     # Build vocabulary: base behaviors + 'other'
     base_behaviors = sorted(set(name[4:] for name in ref_map if name.startswith(('dom_', 'sub_'))))
@@ -87,7 +91,6 @@ def load_dual_role_full_10hz(h5_dir: str, min_start: Optional[float] = None,
     vocab_map = {v: i for i, v in enumerate(vocab)}
     idx_to_name = {i: n for n, i in vocab_map.items()}
     
-    dom_seqs, sub_seqs, file_ids = [], [], []
     other_id = vocab_map['other']
     
     # Precompute remap arrays
@@ -104,126 +107,146 @@ def load_dual_role_full_10hz(h5_dir: str, min_start: Optional[float] = None,
             dom_remap[orig_idx] = other_id
             sub_remap[orig_idx] = other_id
             
-    for f in h5_files:
-        with h5py.File(f, 'r') as hf:
-            arr = hf['/data/behaviors'][:].flatten()
-            fid = os.path.basename(f)
-            
-        total = len(arr)
-        s = int((min_start or 0) * 60 * fps)
-        e = int((min_end or total / 60 / fps) * 60 * fps)
-        arr = arr[max(0,s):min(total,e)]
-        
-        dom_seqs.append(dom_remap[arr].astype(int))
-        sub_seqs.append(sub_remap[arr].astype(int))
-        file_ids.append(fid)
-        
-        if len(file_ids) >= 99: break  # Limit for testing
-        
-    return dom_seqs, sub_seqs, file_ids, idx_to_name, vocab_map, fps, other_id
+    sessions = DualRoleSessionStream(h5_files, dom_remap, sub_remap, fps, len(vocab),
+                                     min_start, min_end, max_files)
+    return sessions, idx_to_name, vocab_map, fps, other_id
 
 # =============================================================================
 # 2. SEGMENT → VECTOR CONVERSION
 # =============================================================================
 
-def compute_segment_vectors(dom_seqs, sub_seqs, file_ids, neutral_ids, fps, vocab_size):
-    """Convert active segments to proportion vectors + metadata."""
-    vectors = []
-    meta_rows = []
+def _iter_tracks(sessions: Iterable) -> Iterable[Tuple[np.ndarray, str, str]]:
+    for fid, dom_seq, sub_seq in sessions:
+        yield dom_seq, fid, 'dom'
+        yield sub_seq, fid, 'sub'
+
+SEGMENT_META_COLUMNS = ['session_id', 'track', 'start_frame', 'end_frame',
+                        'duration_sec', 'start_min', 'end_min']
+
+def compute_segment_vectors(sessions, neutral_ids, fps, vocab_size, min_frames=20):
+    """
+    Convert active segments to proportion vectors + columnar metadata, one streamed session at a time.
     
-    for seq, fid, track in zip(dom_seqs + sub_seqs, file_ids*2, ['dom']*len(file_ids) + ['sub']*len(file_ids)):
+    All segment vectors of a track come from a single prefix-sum table, so there is
+    no per-segment Python work.
+    """
+    vectors, meta_cols = [], {k: [] for k in ('session_id', 'track', 'start_frame', 'end_frame')}
+    for seq, fid, track in _iter_tracks(sessions):
         segments = split_by_neutral(seq, neutral_ids)
-        for start, end in segments:
-            seg = seq[start:end]
-            if len(seg) < 20: continue
-            
-            # Compute proportions
-            counts = np.bincount(seg, minlength=vocab_size)
-            props = counts / len(seg)
-            
-            vectors.append(props)
-            meta_rows.append({
-                'session_id': fid,
-                'track': track,
-                'start_frame': start,
-                'end_frame': end,
-                'duration_sec': len(seg) / fps,
-                'start_min': start / (60 * fps),
-                'end_min': end / (60 * fps)
-            })
-            
-    X = np.array(vectors)
-    meta = pd.DataFrame(meta_rows)
+        segments = segments[segments[:, 1] - segments[:, 0] >= min_frames]
+        if len(segments) == 0:
+            continue
+        
+        # Per-behavior prefix counts: counts in [s, e) = cum[e] - cum[s]
+        # Unassigned frames (label -1) count towards no behavior instead of wrapping to the last column
+        cum = np.zeros((len(seq) + 1, vocab_size), dtype=np.int32)
+        assigned = seq >= 0
+        cum[np.arange(1, len(seq) + 1)[assigned], seq[assigned]] = 1
+        np.cumsum(cum, axis=0, out=cum)
+        
+        starts, ends = segments[:, 0], segments[:, 1]
+        counts = cum[ends] - cum[starts]
+        vectors.append(counts / (ends - starts)[:, None])
+        
+        meta_cols['session_id'].append(np.full(len(segments), fid, dtype=object))
+        meta_cols['track'].append(np.full(len(segments), track, dtype=object))
+        meta_cols['start_frame'].append(starts)
+        meta_cols['end_frame'].append(ends)
+    
+    if not vectors:
+        return np.empty((0, vocab_size)), pd.DataFrame(columns=SEGMENT_META_COLUMNS)
+    
+    X = np.concatenate(vectors)
+    meta = pd.DataFrame({k: np.concatenate(v) for k, v in meta_cols.items()})
+    meta['duration_sec'] = (meta['end_frame'] - meta['start_frame']) / fps
+    meta['start_min'] = meta['start_frame'] / (60 * fps)
+    meta['end_min'] = meta['end_frame'] / (60 * fps)
     return X, meta
- 
+
 # =============================================================================
 # 3. CLUSTERING
 # =============================================================================
 
+def _fit_and_score_k(X_sub: np.ndarray, k: int, minibatch: bool, batch_size: int, random_state: int) -> dict:
+    """Fit one sweep model and score it with silhouette, inertia and Calinski-Harabasz."""
+    if minibatch:
+        km = MiniBatchKMeans(n_clusters=k, init='k-means++', n_init=3, max_iter=300,
+                             batch_size=batch_size, random_state=random_state)
+    else:
+        km = KMeans(n_clusters=k, init='k-means++', n_init=10, max_iter=300, random_state=random_state)
+    km.fit(X_sub)
+    return {
+        'k': k,
+        'silhouette': silhouette_score(X_sub, km.labels_),
+        'inertia': km.inertia_,
+        'calinski_harabasz': calinski_harabasz_score(X_sub, km.labels_),
+        'centers': km.cluster_centers_
+    }
+
 def optimize_and_cluster(X: np.ndarray, k_range: range = range(3, 10), 
-                         silhouette_sample=15000, random_state=42):
+                         silhouette_sample=15000, random_state=42,
+                         criterion: str = 'silhouette', minibatch: bool = False,
+                         batch_size: int = 4096, n_jobs: int = -1):
     """
-    Find optimal k using silhouette on a subsample, then fit KMeans on full data.
-    Returns: final_labels, best_k, silhouette_scores_dict
+    Find optimal k on a subsample, then fit KMeans on full data.
+    
+    The k sweep runs in parallel (optionally with MiniBatchKMeans for large segment sets);
+    criterion picks k by 'silhouette' or 'calinski_harabasz' (higher is better), inertia is
+    reported for elbow inspection. The final full-data KMeans is warm-started from the
+    winning sweep model's centroids.
+    Returns: final_labels, best_k, silhouette_scores_dict, sweep_scores_df
     """
+    if criterion not in ('silhouette', 'calinski_harabasz'):
+        raise ValueError(f"Unknown criterion: {criterion}. Use 'silhouette' or 'calinski_harabasz'.")
+    
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
     
-    # 1. Subsample for efficient silhouette optimization
+    # 1. Subsample for efficient model selection
     if len(X_scaled) > silhouette_sample:
         rng = np.random.RandomState(random_state)
         sub_idx = rng.choice(len(X_scaled), silhouette_sample, replace=False)
         X_sub = X_scaled[sub_idx]
     else:
         X_sub = X_scaled
-        
-    best_k, best_score = None, -1.0
-    silhouette_scores = {}
-    
-    for k in k_range:
-        km = KMeans(n_clusters=k, init='k-means++', n_init=10, max_iter=300, 
-                    random_state=random_state)
-        km.fit(X_sub)
-        score = silhouette_score(X_sub, km.labels_)
-        silhouette_scores[k] = score
-        print(f"  k={k:2d} | Silhouette (n={silhouette_sample}) = {score:.4f}")
-        if score > best_score:
-            best_score, best_k = score, k
-            
-    print(f"✅ Optimal k = {best_k} (Silhouette = {best_score:.4f})")
     
-    # 2. Fit final model on FULL dataset
-    final_km = KMeans(n_clusters=best_k, init='k-means++', n_init=10, max_iter=300,
+    sweep = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score_k)(X_sub, k, minibatch, batch_size, random_state) for k in k_range
+    )
+    for r in sweep:
+        print(f"  k={r['k']:2d} | Silhouette (n={len(X_sub)}) = {r['silhouette']:.4f} | "
+              f"CH = {r['calinski_harabasz']:.1f} | Inertia = {r['inertia']:.1f}")
+    
+    best = max(sweep, key=lambda r: r[criterion])
+    best_k = best['k']
+    silhouette_scores = {r['k']: r['silhouette'] for r in sweep}
+    sweep_df = pd.DataFrame([{key: v for key, v in r.items() if key != 'centers'} for r in sweep])
+    print(f"✅ Optimal k = {best_k} ({criterion} = {best[criterion]:.4f})")
+    
+    # 2. Fit final model on FULL dataset, seeded with the winning sweep centroids
+    final_km = KMeans(n_clusters=best_k, init=best['centers'], n_init=1, max_iter=300,
                       random_state=random_state)
     final_labels = final_km.fit_predict(X_scaled)
     
-    return final_labels, best_k, silhouette_scores
+    return final_labels, best_k, silhouette_scores, sweep_df
 
 # =============================================================================
 # 4. STATISTICAL ANALYSIS WITH FILTERS
 # =============================================================================
 
-def analyze_cluster_preference(meta, cluster_labels, h5_dir, out_dir, vocab, 
+def analyze_cluster_preference(meta, cluster_labels, session_meta, out_dir, vocab, 
                               min_start=None, min_end=None,
                               filter_dates=None, filter_se=None, X=None):
-    """Compute track preference per cluster, respecting all filters."""
-    
-    # Load session metadata
-    session_meta = {}
-    for f in sorted(glob.glob(os.path.join(h5_dir, "*.h5"))):
-        with h5py.File(f, 'r') as hf:
-            attrs = dict(hf['/meta'].attrs)
-            sid = os.path.basename(f)
-            session_meta[sid] = {
-                'day': int(attrs.get('day', 0)),
-                'se': attrs.get('se_status', False)
-            }
-            
+    """
+    Compute track preference per cluster, respecting all filters.
+    
+    session_meta is the loader's in-memory session table (sessions.metadata), indexed by session_id.
+    """
     # Attach metadata
     df = meta.copy()
     df['cluster'] = cluster_labels
-    df['day'] = df['session_id'].map(lambda x: session_meta.get(x, {}).get('day'))
-    df['se_status'] = df['session_id'].map(lambda x: session_meta.get(x, {}).get('se'))
+    df['day'] = df['session_id'].map(session_meta['day'])
+    df['se_status'] = df['session_id'].map(session_meta['se_status'])
     
     # Apply filters
     mask = pd.Series(True, index=df.index)
@@ -443,16 +466,158 @@ def _plot_radar_prototypes(prototypes: dict, idx_to_name: dict,
 # 6. CLUSTER SCATTER PLOT (2D PROJECTION)
 # =============================================================================
 
-def plot_cluster_scatter(X_scaled: np.ndarray, cluster_labels: np.ndarray, 
+def _fit_projection(X_plot: np.ndarray, method: str, random_state: int):
+    """Fit a 2D reducer; returns (reducer, X_2d, axis_labels, method_used)."""
+    if method == 'umap':
+        try:
+            import umap
+            reducer = umap.UMAP(n_components=2, random_state=random_state, n_neighbors=15, min_dist=0.1)
+            return reducer, reducer.fit_transform(X_plot), ['UMAP 1', 'UMAP 2'], 'umap'
+        except ImportError:
+            print("⚠️ UMAP not installed. Falling back to PCA.")
+            reducer = PCA(n_components=2, random_state=random_state)
+            return reducer, reducer.fit_transform(X_plot), ['PC1', 'PC2'], 'pca'
+    if method == 'pca':
+        reducer = PCA(n_components=2, random_state=random_state)
+        X_2d = reducer.fit_transform(X_plot)
+        variance_explained = reducer.explained_variance_ratio_.sum()
+        axis_labels = [f'PC1 ({variance_explained*100:.1f}%)', f'PC2 ({variance_explained*100:.1f}%)']
+        return reducer, X_2d, axis_labels, 'pca'
+    if method == 'tsne':
+        perplexity = min(30, len(X_plot) // 3)
+        reducer = TSNE(n_components=2, perplexity=perplexity, init='pca', 
+                      random_state=random_state, n_iter=1000, learning_rate='auto')
+        return None, reducer.fit_transform(X_plot), ['t-SNE 1', 't-SNE 2'], 'tsne'
+    raise ValueError(f"Unknown method: {method}. Use 'pca', 'tsne', or 'umap'.")
+
+def _fit_fingerprint(X: np.ndarray) -> str:
+    """Hash + shape of the data a reducer was fitted on."""
+    X = np.ascontiguousarray(X)
+    return f"{hashlib.sha1(X.tobytes()).hexdigest()[:12]}_{X.shape[0]}x{X.shape[1]}"
+
+def _row_hashes(X: np.ndarray) -> np.ndarray:
+    """One uint64 hash per row, used to recognise the same segment across runs."""
+    return pd.util.hash_pandas_object(pd.DataFrame(X), index=False).to_numpy()
+
+def _fitted_reducer_paths(cache_dir: str, method: str, params_key: str) -> List[str]:
+    """Stored reducers for one (method, params) pair, newest first."""
+    paths = glob.glob(os.path.join(cache_dir, f"{method}_{params_key}_fit*_reducer.joblib"))
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+def _rows_index_path(reducer_path: str) -> str:
+    return reducer_path[:-len('_reducer.joblib')] + '_rows.npy'
+
+def _find_fitted_reducer(cache_dir: str, method: str, params_key: str,
+                         X_plot: np.ndarray, all_hashes: np.ndarray):
+    """
+    Newest cached reducer whose fitted rows all still occur in the cohort (all_hashes).
+    Membership is tested on the small row-hash index stored next to each reducer; only a
+    matching reducer is loaded.
+    Returns (payload, fit_pos) with fit_pos[i] = row of the fit matching X_plot[i] or -1, else (None, None).
+    """
+    plot_hashes = _row_hashes(X_plot)
+    for path in _fitted_reducer_paths(cache_dir, method, params_key):
+        index_path = _rows_index_path(path)
+        if not os.path.isfile(index_path):
+            continue
+        fit_hashes = np.load(index_path)
+        # The fitted data must be a subset of the current cohort, otherwise the map is stale
+        if not np.isin(fit_hashes, all_hashes).all():
+            continue
+        payload = joblib.load(path)
+        if payload['n_features'] != X_plot.shape[1]:
+            continue
+        order = np.argsort(fit_hashes, kind='stable')
+        pos = np.minimum(np.searchsorted(fit_hashes, plot_hashes, sorter=order), len(order) - 1)
+        fit_pos = np.where(fit_hashes[order[pos]] == plot_hashes, order[pos], -1)
+        return payload, fit_pos
+    return None, None
+
+def _fit_scaled_projection(X_plot: np.ndarray, method: str, random_state: int):
+    """Standardize X_plot and fit a 2D reducer on it; returns (scaler, reducer, X_2d, axis_labels, method_used)."""
+    scaler = StandardScaler().fit(X_plot)
+    reducer, X_2d, axis_labels, method_used = _fit_projection(scaler.transform(X_plot), method, random_state)
+    return scaler, reducer, X_2d, axis_labels, method_used
+
+def project_2d_cached(X_plot: np.ndarray, method: str = 'pca', random_state: int = 42,
+                      cache_dir: Optional[str] = None, reuse_fitted: bool = True,
+                      X_all: Optional[np.ndarray] = None, keep_fitted: int = 3):
+    """
+    Standardized 2D projection of unscaled segment vectors, with an on-disk cache.
+    
+    Embeddings are keyed by a hash of the input plus the method parameters, so rerunning
+    on unchanged data is a file read. For PCA/UMAP the fitted scaler and reducer are stored
+    together with the embedding of their training rows, plus a row-hash index of those rows.
+    Everything is keyed on unscaled rows, so rescaling or resampling the cohort does not
+    invalidate a fit. With reuse_fitted, a stored reducer is reused when all of its training
+    rows are still in the cohort X_all (default: X_plot), i.e. segments were added: rows it was
+    fitted on keep their coordinates and only the other rows go through scaler + transform.
+    Anything else refits the map. Only the newest keep_fitted reducers per method are kept.
+    Returns: X_2d, axis_labels
+    """
+    if method not in ('pca', 'tsne', 'umap'):
+        raise ValueError(f"Unknown method: {method}. Use 'pca', 'tsne', or 'umap'.")
+    if cache_dir is None:
+        _, _, X_2d, axis_labels, _ = _fit_scaled_projection(X_plot, method, random_state)
+        return X_2d, axis_labels
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    params_key = hashlib.sha1(json.dumps({'method': method, 'random_state': random_state}).encode()).hexdigest()[:12]
+    data_key = hashlib.sha1(np.ascontiguousarray(X_plot).tobytes() + params_key.encode()).hexdigest()[:16]
+    emb_path = os.path.join(cache_dir, f"{method}_{data_key}.npz")
+    
+    if os.path.isfile(emb_path):
+        with np.load(emb_path) as data:
+            print(f"♻️ Loaded cached {method.upper()} embedding ({os.path.basename(emb_path)})")
+            return data['X_2d'], [str(a) for a in data['axis_labels']]
+    
+    payload, fit_pos = None, None
+    if reuse_fitted and method != 'tsne':
+        all_hashes = _row_hashes(X_plot if X_all is None else X_all)
+        payload, fit_pos = _find_fitted_reducer(cache_dir, method, params_key, X_plot, all_hashes)
+    
+    if payload is not None:
+        new_rows = fit_pos < 0
+        print(f"➕ Projecting {new_rows.sum():,} segments outside the fit onto existing {method.upper()} embedding "
+              f"(fit {payload['fingerprint']})")
+        X_2d = np.empty((len(X_plot), 2), dtype=payload['X_2d_fit'].dtype)
+        X_2d[~new_rows] = payload['X_2d_fit'][fit_pos[~new_rows]]
+        if new_rows.any():
+            X_2d[new_rows] = payload['reducer'].transform(payload['scaler'].transform(X_plot[new_rows]))
+        axis_labels = payload['axis_labels']
+    else:
+        scaler, reducer, X_2d, axis_labels, method_used = _fit_scaled_projection(X_plot, method, random_state)
+        if reducer is not None and method_used == method:
+            fingerprint = _fit_fingerprint(X_plot)
+            reducer_path = os.path.join(cache_dir, f"{method}_{params_key}_fit{fingerprint}_reducer.joblib")
+            joblib.dump(
+                {'scaler': scaler, 'reducer': reducer, 'fingerprint': fingerprint,
+                 'n_features': X_plot.shape[1], 'X_2d_fit': X_2d, 'axis_labels': axis_labels},
+                reducer_path
+            )
+            np.save(_rows_index_path(reducer_path), _row_hashes(X_plot))
+            for old_path in _fitted_reducer_paths(cache_dir, method, params_key)[keep_fitted:]:
+                for path in (old_path, _rows_index_path(old_path)):
+                    if os.path.isfile(path):
+                        os.remove(path)
+    
+    np.savez_compressed(emb_path, X_2d=X_2d, axis_labels=np.array(axis_labels))
+    return X_2d, axis_labels
+
+def plot_cluster_scatter(X: np.ndarray, cluster_labels: np.ndarray, 
                         meta: pd.DataFrame, out_dir: str,
                         max_samples: int = 10000, 
                         method: str = 'pca',
                         random_state: int = 42,
-                        figsize: Tuple[int, int] = (10, 8)):
-    """Create a 2D scatter plot of segments colored by cluster assignment."""
-    from sklearn.decomposition import PCA
-    from sklearn.manifold import TSNE
+                        figsize: Tuple[int, int] = (10, 8),
+                        use_cache: bool = True,
+                        reuse_fitted: bool = True):
+    """
+    Create a 2D scatter plot of segments colored by cluster assignment.
     
+    X holds the unscaled segment vectors; standardization happens inside the projection.
+    Projections are cached under out_dir/embedding_cache (see project_2d_cached).
+    """
     n_total = len(cluster_labels)
     if n_total > max_samples:
         rng = np.random.RandomState(random_state)
@@ -464,41 +629,19 @@ def plot_cluster_scatter(X_scaled: np.ndarray, cluster_labels: np.ndarray,
             sampled = rng.choice(cluster_idx, size=min(n_sample, len(cluster_idx)), replace=False)
             sampled_idx.extend(sampled)
         sampled_idx = np.array(sampled_idx)
-        X_plot = X_scaled[sampled_idx]
+        X_plot = X[sampled_idx]
         labels_plot = cluster_labels[sampled_idx]
         meta_plot = meta.iloc[sampled_idx].copy()
         print(f"📊 Subsampled {len(sampled_idx):,} segments (stratified by cluster) for visualization")
     else:
-        X_plot = X_scaled
+        X_plot = X
         labels_plot = cluster_labels
         meta_plot = meta.copy()
         print(f"📊 Using all {len(labels_plot):,} segments for visualization")
     
     print(f"🔄 Reducing dimensions with {method.upper()}...")
-    if method == 'pca':
-        reducer = PCA(n_components=2, random_state=random_state)
-        X_2d = reducer.fit_transform(X_plot)
-        variance_explained = reducer.explained_variance_ratio_.sum()
-        axis_labels = [f'PC1 ({variance_explained*100:.1f}%)', f'PC2 ({variance_explained*100:.1f}%)']
-    elif method == 'tsne':
-        perplexity = min(30, len(X_plot) // 3)
-        reducer = TSNE(n_components=2, perplexity=perplexity, init='pca', 
-                      random_state=random_state, n_iter=1000, learning_rate='auto')
-        X_2d = reducer.fit_transform(X_plot)
-        axis_labels = ['t-SNE 1', 't-SNE 2']
-    elif method == 'umap':
-        try:
-            import umap
-            reducer = umap.UMAP(n_components=2, random_state=random_state, n_neighbors=15, min_dist=0.1)
-            X_2d = reducer.fit_transform(X_plot)
-            axis_labels = ['UMAP 1', 'UMAP 2']
-        except ImportError:
-            print("⚠️ UMAP not installed. Falling back to PCA.")
-            reducer = PCA(n_components=2, random_state=random_state)
-            X_2d = reducer.fit_transform(X_plot)
-            axis_labels = ['PC1', 'PC2']
-    else:
-        raise ValueError(f"Unknown method: {method}. Use 'pca', 'tsne', or 'umap'.")
+    cache_dir = os.path.join(out_dir, 'embedding_cache') if use_cache else None
+    X_2d, axis_labels = project_2d_cached(X_plot, method, random_state, cache_dir, reuse_fitted, X_all=X)
     
     fig, ax = plt.subplots(figsize=figsize)
     n_clusters = len(np.unique(labels_plot))
@@ -577,29 +720,27 @@ def main():
     os.makedirs(out_dir, exist_ok=True)
     
     print("📥 Loading sessions & remapping roles...")
-    dom_s, sub_s, fids, idx_name, vocab_map, fps, other_id = load_dual_role_full_10hz(h5_dir)
-    print(f"   ✅ {len(dom_s)} sessions | {len(vocab_map)} behaviors | {fps}Hz")
+    sessions, idx_name, vocab_map, fps, other_id = load_dual_role_full_10hz(h5_dir)
+    print(f"   ✅ {len(sessions)} sessions | {len(vocab_map)} behaviors | {fps}Hz")
     
     neutral_ids = [other_id]
     vocab_size = len(vocab_map)
     
     print("⏱️ Computing segment proportion vectors...")
-    X, meta = compute_segment_vectors(dom_s, sub_s, fids, neutral_ids, fps, vocab_size)
+    X, meta = compute_segment_vectors(sessions, neutral_ids, fps, vocab_size)
     print(f"   ✅ {len(X)} active segments extracted")
     
     print("🔍 Optimizing clusters (silhouette score)...")
-    cluster_labels, best_k, silhouette_scores = optimize_and_cluster(X, k_range=range(4, 15))
+    cluster_labels, best_k, silhouette_scores, sweep_df = optimize_and_cluster(X, k_range=range(4, 15))
     meta['cluster'] = cluster_labels
+    sweep_df.to_csv(os.path.join(out_dir, 'cluster_k_sweep.csv'), index=False)
 
     print("📊 Plotting silhouette analysis...")
     plot_silhouette_analysis(silhouette_scores, best_k, out_dir)
 
     print("🎯 Creating cluster scatter plot (2D projection)...")
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
     plot_cluster_scatter(
-        X_scaled=X_scaled,
+        X=X,
         cluster_labels=cluster_labels,
         meta=meta,
         out_dir=out_dir,
@@ -612,7 +753,7 @@ def main():
 
     print("📊 Analyzing filtered cluster preference...")
     comp_df = analyze_cluster_preference(
-        meta, cluster_labels, h5_dir, out_dir, idx_name,
+        meta, cluster_labels, sessions.metadata, out_dir, idx_name,
         min_start=0, min_end=481,
         filter_dates=[1],
         filter_se="SE",
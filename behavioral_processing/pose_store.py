@@ -0,0 +1,137 @@
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def pose_cache_path(pose_file: str, cache_dir: Optional[str] = None) -> str:
+    """Cache metadata file for a pose CSV (default: a 'pose_cache' folder next to the CSV)."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(pose_file), "pose_cache")
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(pose_file))[0]}.npz")
+
+def _data_path(cache_path: str) -> str:
+    """The pose array is kept beside its metadata as a plain .npy so it can be memory-mapped."""
+    return f"{os.path.splitext(cache_path)[0]}.npy"
+
+def _source_stamp(pose_file: str) -> np.ndarray:
+    st = os.stat(pose_file)
+    return np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+def build_pose_cache(pose_file: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Parse a 3-level (individual, bodypart, coord) pose CSV once and store it as a
+    float32 .npy array plus an .npz with its column index, frame count and source stamp.
+    The metadata is written last, so a valid stamp implies a complete array.
+    Returns the metadata path.
+    """
+    path = pose_cache_path(pose_file, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    df = pd.read_csv(pose_file, header=[0, 1, 2])
+    data = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+    columns = np.array([[str(level) for level in col] for col in df.columns], dtype=str).reshape(-1, 3)
+
+    data_path = _data_path(path)
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as fh:
+        np.save(fh, data)
+    os.replace(tmp_path, data_path)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as fh:
+        np.savez(fh, columns=columns, n_frames=len(df), source=_source_stamp(pose_file))
+    os.replace(tmp_path, path)
+    return path
+
+def _cached_path(pose_file: str, cache_dir: Optional[str]) -> str:
+    """Cache path for pose_file, (re)building it when missing or older than the CSV."""
+    path = pose_cache_path(pose_file, cache_dir)
+    if os.path.isfile(path) and os.path.isfile(_data_path(path)):
+        with np.load(path) as cached:
+            if np.array_equal(cached['source'], _source_stamp(pose_file)):
+                return path
+    return build_pose_cache(pose_file, cache_dir)
+
+def load_pose_array(pose_file: str, cache_dir: Optional[str] = None,
+                    mmap_mode: Optional[str] = None) -> Tuple[np.ndarray, List[Tuple[str, str, str]], int]:
+    """
+    Returns (data float32 [n_frames, n_cols], columns [(individual, bodypart, coord)], n_frames).
+    With mmap_mode (e.g. 'r') data is a memory map and only the rows that are indexed are read.
+    """
+    path = _cached_path(pose_file, cache_dir)
+    with np.load(path) as cached:
+        columns = [tuple(col) for col in cached['columns'].tolist()]
+        n_frames = int(cached['n_frames'])
+    return np.load(_data_path(path), mmap_mode=mmap_mode), columns, n_frames
+
+def load_pose_frame(pose_file: str, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """Pose table with the same 3-level column MultiIndex as pd.read_csv(header=[0, 1, 2])."""
+    data, columns, _ = load_pose_array(pose_file, cache_dir)
+    return pd.DataFrame(data, columns=pd.MultiIndex.from_tuples(columns))
+
+def pose_frame_count(pose_file: str, cache_dir: Optional[str] = None) -> int:
+    """Number of frames in a pose file, read from the cache without loading the array."""
+    with np.load(_cached_path(pose_file, cache_dir)) as cached:
+        return int(cached['n_frames'])
+
+
+class PoseView:
+    """
+    Lazy stand-in for the concatenated masked pose rows of many files.
+
+    Global row g (the g-th feature row) maps to (file, frame) through the per-file
+    valid frame indices. Nothing is loaded up front except the column index; pose arrays
+    are memory-mapped from the pose cache, a window reads only its frames and columns,
+    and the maps of the few most recently used files are kept open.
+    """
+
+    def __init__(self, pose_files: List[str], frame_indices: List[np.ndarray],
+                 cache_dir: Optional[str] = None, max_open_files: int = 4):
+        self.pose_files = list(pose_files)
+        self.frame_indices = [np.asarray(ix) for ix in frame_indices]
+        self.cache_dir = cache_dir
+        self.max_open_files = max_open_files
+        self.offsets = np.concatenate(([0], np.cumsum([len(ix) for ix in self.frame_indices])))
+        self._open = OrderedDict()
+
+        columns = {}
+        for f in self.pose_files:
+            with np.load(_cached_path(f, cache_dir)) as cached:
+                columns.update(dict.fromkeys(tuple(col) for col in cached['columns'].tolist()))
+        self.columns = pd.MultiIndex.from_tuples(list(columns))
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def locate(self, global_idx: int) -> Tuple[int, int]:
+        """(file index, pose frame) of a global feature row."""
+        file_idx = int(np.searchsorted(self.offsets, global_idx, side='right') - 1)
+        return file_idx, int(self.frame_indices[file_idx][global_idx - self.offsets[file_idx]])
+
+    def _file_data(self, file_idx: int) -> Tuple[np.ndarray, Dict[Tuple[str, str, str], int]]:
+        if file_idx in self._open:
+            self._open.move_to_end(file_idx)
+        else:
+            data, columns, _ = load_pose_array(self.pose_files[file_idx], self.cache_dir, mmap_mode='r')
+            self._open[file_idx] = (data, {col: i for i, col in enumerate(columns)})
+            if len(self._open) > self.max_open_files:
+                self._open.popitem(last=False)
+        return self._open[file_idx]
+
+    def window(self, start: int, end: int, cols: List[Tuple[str, str, str]]) -> np.ndarray:
+        """
+        Values of cols for global rows start..end (inclusive, within one file) as a
+        [n_rows, n_cols] float array; columns missing from that file are NaN.
+        """
+        file_idx = int(np.searchsorted(self.offsets, start, side='right') - 1)
+        data, col_pos = self._file_data(file_idx)
+        local = slice(start - self.offsets[file_idx], end + 1 - self.offsets[file_idx])
+        frames = self.frame_indices[file_idx][local]
+
+        out = np.full((len(frames), len(cols)), np.nan, dtype=data.dtype)
+        present = [j for j, col in enumerate(cols) if col in col_pos]
+        if present and len(frames):
+            out[:, present] = data[frames][:, [col_pos[cols[j]] for j in present]]
+        return out
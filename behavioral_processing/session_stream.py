@@ -0,0 +1,108 @@
+import os
+import json
+import glob
+import h5py
+import numpy as np
+import pandas as pd
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+def compact_label_dtype(n_labels: int) -> np.dtype:
+    """Smallest signed integer dtype holding labels 0..n_labels-1 and the -1 sentinel."""
+    return np.dtype(np.int8) if n_labels <= np.iinfo(np.int8).max else np.dtype(np.int16)
+
+def read_reference_map(h5_dir: str) -> Tuple[List[str], List[str], float]:
+    """List session files and read the behavior map / fps from the first one."""
+    h5_files = sorted(glob.glob(os.path.join(h5_dir, "*.h5")))
+    if not h5_files:
+        raise ValueError("No .h5 files found.")
+
+    with h5py.File(h5_files[0], 'r') as f:
+        ref_map = json.loads(f['/meta/behavior_map'][()])
+        fps = float(f['/meta'].attrs.get('fps', 10.0))
+    return h5_files, ref_map, fps
+
+
+class DualRoleSessionStream:
+    """
+    Re-iterable stream of (session_id, dom_seq, sub_seq), one .h5 file at a time.
+
+    Remap tables are built once by the caller and stored in the compact label
+    dtype, so every yielded sequence is int8/int16 and only one session is held
+    in memory. Each iteration reopens the files, so the stream can be consumed
+    by several passes (segmentation, vectorization, ...) without caching.
+
+    The /meta attributes of every file opened during iteration are recorded, so
+    `metadata` (day, se_status, fps, n_frames per session) is available in memory
+    for later filtering and joins.
+    """
+
+    def __init__(
+        self,
+        h5_files: List[str],
+        dom_remap: np.ndarray,
+        sub_remap: np.ndarray,
+        fps: float,
+        n_labels: int,
+        min_start: Optional[float] = None,
+        min_end: Optional[float] = None,
+        max_files: Optional[int] = None,
+        id_from_attrs: bool = False,
+        transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ):
+        self.h5_files = h5_files[:max_files] if max_files else list(h5_files)
+        self.dtype = compact_label_dtype(n_labels)
+        self.dom_remap = dom_remap.astype(self.dtype)
+        self.sub_remap = sub_remap.astype(self.dtype)
+        self.fps = fps
+        self.min_start = min_start
+        self.min_end = min_end
+        self.id_from_attrs = id_from_attrs
+        self.transform = transform
+        self._meta_rows = {}
+
+    def __len__(self) -> int:
+        return len(self.h5_files)
+
+    def _record_meta(self, f: str, hf: h5py.File) -> str:
+        attrs = hf['/meta'].attrs
+        fid = os.path.basename(f)
+        if self.id_from_attrs:
+            fid = attrs.get('session_id', fid)
+        self._meta_rows[f] = {
+            'session_id': fid,
+            'file': f,
+            'day': int(attrs.get('day', 0)),
+            'se_status': bool(attrs.get('se_status', False)),
+            'fps': float(attrs.get('fps', self.fps)),
+            'n_frames': int(hf['/data/behaviors'].shape[0])
+        }
+        return fid
+
+    @property
+    def metadata(self) -> pd.DataFrame:
+        """Per-session attributes indexed by session_id (files not yet streamed are read once)."""
+        for f in self.h5_files:
+            if f not in self._meta_rows:
+                with h5py.File(f, 'r') as hf:
+                    self._record_meta(f, hf)
+        rows = [self._meta_rows[f] for f in self.h5_files]
+        return pd.DataFrame(rows).set_index('session_id')
+
+    def __iter__(self) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        for f in self.h5_files:
+            with h5py.File(f, 'r') as hf:
+                arr = hf['/data/behaviors'][:].flatten()
+                fid = self._record_meta(f, hf)
+
+            total = len(arr)
+            s = int((self.min_start or 0) * 60 * self.fps)
+            e = int((self.min_end or total / 60 / self.fps) * 60 * self.fps)
+            arr = arr[max(0, s):min(total, e)]
+
+            dom_arr = self.dom_remap[arr]
+            sub_arr = self.sub_remap[arr]
+            if self.transform is not None:
+                dom_arr = self.transform(dom_arr)
+                sub_arr = self.transform(sub_arr)
+            yield fid, dom_arr, sub_arr
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from behav_separator import extract_features
+
+
+def _write_pose_csv(path, n_frames=60, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = pd.MultiIndex.from_tuples([
+        (ind, part, coord)
+        for ind in ('mouse1', 'mouse2')
+        for part in ('Snout', 'Center', 'Tail(base)')
+        for coord in ('x', 'y', 'likelihood')
+    ])
+    pd.DataFrame(rng.uniform(0, 500, (n_frames, len(columns))), columns=columns).to_csv(path, index=False)
+
+
+def test_feature_names_match_stacked_columns(tmp_path):
+    pose_file = str(tmp_path / "sess.csv")
+    _write_pose_csv(pose_file)
+    n_frames = 60
+
+    feats, _, names, final_mask = extract_features(
+        pose_file, np.ones(n_frames, dtype=bool), window_size=[3, 5], feature_subset='default',
+        pose_cache_dir=str(tmp_path / "pose_cache"), min_angle_deg=0.0)
+    assert feats.shape[1] == len(names)
+
+    df = pd.read_csv(pose_file, header=[0, 1, 2])
+    centroid = {
+        ind: [df[[c for c in df.columns if c[0] == ind and c[2] == coord]].astype(np.float32).mean(axis=1).to_numpy()
+              for coord in ('x', 'y')]
+        for ind in ('mouse1', 'mouse2')
+    }
+    dist = np.hypot(centroid['mouse1'][0] - centroid['mouse2'][0], centroid['mouse1'][1] - centroid['mouse2'][1])
+    padded = np.concatenate((np.full(4, dist[0]), dist))
+    expected = np.array([padded[i:i + 5].mean() for i in range(n_frames)])
+
+    np.testing.assert_allclose(feats[:, names.index("dist_win5_mean")], expected[final_mask], rtol=1e-4)
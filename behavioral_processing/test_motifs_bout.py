@@ -0,0 +1,18 @@
+import numpy as np
+
+from motifs_bout import _new_cat_hmm, _fit_cat_hmm_stage
+
+
+def test_fit_stages_run_the_requested_iterations():
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 6, size=(2000, 1))
+    lengths = [500] * 4
+
+    model = _new_cat_hmm(4, 6, 1e-12, 0)
+    model, _, status, _ = _fit_cat_hmm_stage(model, X, lengths, 30, False)
+    assert status == 'running'
+    assert model.monitor_.iter == 30
+
+    model, _, status, _ = _fit_cat_hmm_stage(model, X, lengths, 45, True)
+    assert status == 'max_iter'
+    assert model.monitor_.iter == 45